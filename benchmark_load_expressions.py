@@ -0,0 +1,106 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import time
+
+import numpy as np
+
+import expression_store # type: ignore
+import myutils # type: ignore
+
+# ----- Benchmark loading the expressions for one solution value -----
+
+# "scan" reproduces the old read path: the unary + keeps SQLite from using
+# the clustered key or the covering index, so every lookup is a full scan.
+# "indexed" is the SQLite query load_expressions falls back to and "store"
+# slices the memory-mapped packed store.
+
+QUERIES = {
+    "scan": "SELECT string FROM valid_guesses WHERE +integer = ?",
+    "indexed": "SELECT string FROM valid_guesses WHERE integer = ?",
+}
+
+DEFAULT_VALUES = [1, 7, 53, 100, 365, 1000, 4096, 10000, 100000]
+
+def time_query(conn, query:str, sol:int) -> tuple[float, int]:
+    """Runs one lookup and returns (seconds, number of rows)."""
+
+    start_time = time.perf_counter()
+    rows = conn.execute(query, (sol,)).fetchall()
+    return time.perf_counter() - start_time, len(rows)
+
+def benchmark_value(db_path:str, query:str, sol:int, repeat:int) -> dict:
+    """Times a cold and several warm loads of one solution value.
+
+    Cold means a fresh connection, i.e. an empty SQLite page cache (the OS
+    page cache is not dropped). Warm reuses that connection.
+    """
+
+    conn = sqlite3.connect(db_path)
+    cold, n_rows = time_query(conn, query, sol)
+    warm = [time_query(conn, query, sol)[0] for _ in range(repeat)]
+    conn.close()
+    return {"solution": sol, "rows": n_rows, "cold": cold,
+            "warm": statistics.median(warm)}
+
+def time_store_load(store, sol:int) -> tuple[float, int]:
+    start_time = time.perf_counter()
+    # np.array forces the pages in, a bare slice would not touch them
+    n_rows = len(np.array(store.load(sol)))
+    return time.perf_counter() - start_time, n_rows
+
+def benchmark_store_value(store_path:str, sol:int, repeat:int) -> dict:
+    """Same as benchmark_value for the packed store, cold = fresh mmap."""
+
+    store = expression_store.ExpressionStore(store_path)
+    cold, n_rows = time_store_load(store, sol)
+    warm = [time_store_load(store, sol)[0] for _ in range(repeat)]
+    return {"solution": sol, "rows": n_rows, "cold": cold,
+            "warm": statistics.median(warm)}
+
+def footprint(paths:list) -> str:
+    size = sum(os.path.getsize(path) for path in paths if os.path.exists(path))
+    return f"{size / 2**20:.1f} MiB"
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time valid_guesses lookups by solution value.")
+    parser.add_argument("--db", default=myutils.DB_PATH)
+    parser.add_argument("--values", type=int, nargs="+",
+                        default=DEFAULT_VALUES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--store", default=expression_store.STORE_PATH)
+    parser.add_argument("--modes", nargs="+",
+                        choices=list(QUERIES) + ["store"],
+                        default=list(QUERIES) + ["store"])
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    myutils.ensure_value_index(conn)
+    conn.close()
+
+    print(f"SQLite database: {footprint([args.db])}")
+    if "store" in args.modes:
+        if expression_store.store_exists(args.store):
+            print("Packed store: " + footprint(
+                expression_store.store_files(args.store)))
+        else:
+            print(f"No packed store at {args.store}, skipping mode store")
+            args.modes.remove("store")
+
+    print(f"{'mode':<8} {'solution':>9} {'rows':>9} " +
+          f"{'cold [ms]':>11} {'warm [ms]':>11}")
+    for mode in args.modes:
+        for sol in args.values:
+            if mode == "store":
+                result = benchmark_store_value(args.store, sol, args.repeat)
+            else:
+                result = benchmark_value(args.db, QUERIES[mode], sol,
+                                         args.repeat)
+            print(f"{mode:<8} {result['solution']:>9} {result['rows']:>9} " +
+                  f"{result['cold'] * 1000:>11.2f} " +
+                  f"{result['warm'] * 1000:>11.2f}")
+
+if __name__ == '__main__':
+    main()
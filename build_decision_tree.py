@@ -0,0 +1,194 @@
+import argparse
+import multiprocessing
+import sqlite3
+import time
+
+import numpy as np
+
+import build_metrics # type: ignore
+import expression_store # type: ignore
+import feedback_patterns # type: ignore
+import myutils # type: ignore
+
+# ----- Full decision trees for selected solution values -----
+
+# A node is reached by the feedback patterns received so far and stores the
+# guess to play there, chosen by entropy on exactly the candidates that are
+# consistent with that feedback. Guesses are always candidates, so every
+# path ends with an all-green pattern. Tables in decision_tree.db:
+#   tree_node   ((integer, prefix) PK, guess, n_candidates)
+#               prefix = myutils.encode_prefix(pattern codes so far)
+#   tree_stats  (integer PK, n_candidates, n_nodes, depth,
+#                expected_guesses)
+# The subtrees below the root guess are built in parallel.
+
+TREE_BUDGET = 4 * myutils.ENTROPY_BUDGET
+SEED = 0 # fixed, so a rebuilt tree is the same
+
+def create_tables(conn) -> None:
+    conn.execute("CREATE TABLE IF NOT EXISTS tree_node " +
+                 "(integer INTEGER NOT NULL, prefix BLOB NOT NULL, " +
+                 "guess TEXT NOT NULL, n_candidates INTEGER NOT NULL, " +
+                 "PRIMARY KEY (integer, prefix)) WITHOUT ROWID")
+    conn.execute("CREATE TABLE IF NOT EXISTS tree_stats " +
+                 "(integer INTEGER PRIMARY KEY, " +
+                 "n_candidates INTEGER NOT NULL, n_nodes INTEGER NOT NULL, " +
+                 "depth INTEGER NOT NULL, expected_guesses REAL NOT NULL)")
+    conn.commit()
+
+def _choose(candidates:np.ndarray, budget:int,
+            rng:np.random.Generator) -> int:
+    return myutils.select_entropy_guess(candidates, budget, rng)
+
+def _children(candidates:np.ndarray, row:int) -> list:
+    """(pattern, candidates) of every non-winning feedback of a guess."""
+
+    patterns = feedback_patterns.pattern_row(candidates[row], candidates)
+    order = np.argsort(patterns, kind="stable")
+    starts = np.flatnonzero(np.diff(patterns[order])) + 1
+    return [(int(patterns[group[0]]), candidates[group])
+            for group in np.split(order, starts)
+            if patterns[group[0]] != feedback_patterns.ALL_GREEN]
+
+def build_subtree(sol:int, prefix:list, candidates:np.ndarray,
+                  budget:int = TREE_BUDGET) -> tuple:
+    """
+    Builds the decision tree below one node.
+
+    Args:
+        sol (int): The solution value.
+        prefix (list of int): Feedback codes leading to the node.
+        candidates (np.ndarray): Symbol matrix of the node's candidates.
+        budget (int, optional): Work budget per guess.
+
+    Returns:
+        tuple: (sol, nodes, total_guesses, depth)
+            - nodes (list): (prefix key, guess, n_candidates) per node.
+            - total_guesses (int): Sum over the candidates of the guesses
+              needed to solve them, counted from the root.
+            - depth (int): Guesses needed in the worst case.
+    """
+
+    rng = np.random.default_rng(SEED)
+    nodes = []
+    total_guesses = 0
+    depth = 0
+    stack = [(prefix, candidates)]
+    while stack:
+        node_prefix, node_candidates = stack.pop()
+        row = _choose(node_candidates, budget, rng)
+        guess = expression_store.decode_expressions(
+            node_candidates[row:row + 1])[0]
+        nodes.append((myutils.encode_prefix(node_prefix), guess,
+                      len(node_candidates)))
+        n_guesses = len(node_prefix) + 1
+        total_guesses += n_guesses # the guess itself is solved here
+        depth = max(depth, n_guesses)
+        for pattern, child in _children(node_candidates, row):
+            stack.append((node_prefix + [pattern], child))
+    return sol, nodes, total_guesses, depth
+
+def _build_subtree_star(args:tuple) -> tuple:
+    start_time = time.perf_counter()
+    return build_subtree(*args), time.perf_counter() - start_time
+
+def main(values:list, processes:int = None,
+         tree_path:str = myutils.TREE_PATH, budget:int = TREE_BUDGET,
+         metrics_path:str = None):
+    """
+    Builds the decision trees of the given values, finished values (with an
+    entry in tree_stats) are skipped.
+
+    Args:
+        values (list of int): Solution values.
+        processes (int, optional): Worker processes, defaults to the number
+            of cores.
+        tree_path (str, optional): The tree database.
+        budget (int, optional): Work budget per guess.
+        metrics_path (str, optional): JSON lines file for build metrics.
+    """
+
+    conn = sqlite3.connect(tree_path)
+    create_tables(conn)
+    done = {row[0] for row in conn.execute("SELECT integer FROM tree_stats")}
+
+    # the root guesses are cheap compared to the subtrees below them
+    rng = np.random.default_rng(SEED)
+    roots = {}
+    subtrees = []
+    for sol in values:
+        if sol in done:
+            continue
+        candidates = expression_store.unpack_symbols(
+            myutils.load_packed_expressions(sol))
+        if len(candidates) == 0:
+            print(f"no expressions for {sol}, skipping")
+            continue
+        row = _choose(candidates, budget, rng)
+        children = _children(candidates, row)
+        guess = expression_store.decode_expressions(candidates[row:row + 1])
+        roots[sol] = {"guess": guess[0], "n_candidates": len(candidates),
+                      "subtrees_left": len(children), "n_nodes": 1,
+                      "total_guesses": 1, "depth": 1}
+        subtrees += [(sol, [pattern], child, budget)
+                     for pattern, child in children]
+
+    for sol, root in roots.items():
+        conn.execute("INSERT OR REPLACE INTO tree_node " +
+                     "(integer, prefix, guess, n_candidates) " +
+                     "VALUES (?, ?, ?, ?)",
+                     (sol, myutils.encode_prefix([]), root["guess"],
+                      root["n_candidates"]))
+    conn.commit()
+
+    def finish_value(sol:int) -> None:
+        root = roots[sol]
+        expected = root["total_guesses"] / root["n_candidates"]
+        conn.execute("INSERT OR REPLACE INTO tree_stats (integer, " +
+                     "n_candidates, n_nodes, depth, expected_guesses) " +
+                     "VALUES (?, ?, ?, ?, ?)",
+                     (sol, root["n_candidates"], root["n_nodes"],
+                      root["depth"], expected))
+        conn.commit()
+        print(f"tree for {sol}: {root['n_candidates']} candidates, " +
+              f"{root['n_nodes']} nodes, depth {root['depth']}, " +
+              f"{expected:.3f} expected guesses")
+
+    for sol, root in roots.items():
+        if root["subtrees_left"] == 0:
+            finish_value(sol)
+
+    metrics = build_metrics.BuildMetrics(metrics_path,
+                                         units_total=len(subtrees),
+                                         verbose=False)
+    metrics.start()
+    with multiprocessing.Pool(processes) as pool:
+        for (sol, nodes, total_guesses, depth), seconds in \
+                pool.imap_unordered(_build_subtree_star, subtrees):
+            conn.executemany("INSERT OR REPLACE INTO tree_node " +
+                             "(integer, prefix, guess, n_candidates) " +
+                             "VALUES (?, ?, ?, ?)",
+                             [(sol, *node) for node in nodes])
+            conn.commit()
+            metrics.unit_finished(str(sol), nodes[0][2], len(nodes), seconds)
+            root = roots[sol]
+            root["n_nodes"] += len(nodes)
+            root["total_guesses"] += total_guesses
+            root["depth"] = max(root["depth"], depth)
+            root["subtrees_left"] -= 1
+            if root["subtrees_left"] == 0:
+                finish_value(sol)
+    metrics.finish()
+    conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Precompute full decision trees for solution values.")
+    parser.add_argument("values", type=int, nargs="+")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--tree", default=myutils.TREE_PATH)
+    parser.add_argument("--budget", type=int, default=TREE_BUDGET)
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for the build metrics")
+    args = parser.parse_args()
+    main(args.values, args.processes, args.tree, args.budget, args.metrics)
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+
+# ----- Structured progress and throughput metrics for the builders -----
+
+# Every event is a flat dict with an "event" field, written as one JSON line
+# and/or handed to a callback. Events of a build:
+#   start   units_total
+#   unit    one finished work unit: candidates, valid, seconds, rates, ETA
+#   insert  one executemany of the writer: rows, seconds
+#   commit  one transaction of the writer: rows, seconds
+#   finish  totals of the whole build
+# Lines are short and appended with O_APPEND, so the writer process and the
+# main process can share one file.
+
+METRICS_PATH = 'build_metrics.jsonl'
+
+class BuildMetrics:
+    """Collects metrics of a build and emits them as machine-readable records.
+
+    Args:
+        path (str, optional): JSON lines file the records are appended to,
+            None disables the file.
+        callback (callable, optional): Called with every record (a dict).
+        units_total (int, optional): Exact number of work units of the run.
+        verbose (bool, optional): Print a progress line every 1% of units.
+    """
+
+    def __init__(self, path:str = METRICS_PATH, callback = None,
+                 units_total:int = 0, verbose:bool = True):
+        self.path = path
+        self.callback = callback
+        self.units_total = units_total
+        self.verbose = verbose
+        self.start_time = time.time()
+        self.units_done = 0
+        self.candidates = 0
+        self.valid = 0
+
+    def emit(self, event:str, **fields) -> dict:
+        record = {"event": event, "time": round(time.time(), 3), **fields}
+        if self.path is not None:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record) + "\n")
+        if self.callback is not None:
+            self.callback(record)
+        return record
+
+    def start(self) -> dict:
+        self.start_time = time.time()
+        return self.emit("start", pid=os.getpid(),
+                         units_total=self.units_total)
+
+    def unit_finished(self, unit:str, candidates:int, valid:int,
+                      seconds:float) -> dict:
+        """Records a finished work unit, rates are per unit and cumulative."""
+
+        self.units_done += 1
+        self.candidates += candidates
+        self.valid += valid
+        elapsed = time.time() - self.start_time
+        units_left = self.units_total - self.units_done
+        record = self.emit(
+            "unit", unit=unit, kind=unit.split(":")[0],
+            candidates=candidates, valid=valid, seconds=round(seconds, 4),
+            expr_per_sec=round(candidates / seconds) if seconds > 0 else None,
+            valid_rate=round(valid / candidates, 4) if candidates else None,
+            units_done=self.units_done, units_total=self.units_total,
+            elapsed=round(elapsed, 1),
+            total_expr_per_sec=round(self.candidates / elapsed)
+                if elapsed > 0 else None,
+            eta=round(elapsed / self.units_done * units_left, 1))
+        if self.verbose and self.units_total > 0 and self.units_done % max(
+                1, round(self.units_total / 100)) == 0:
+            print(f"[----- Work units {self.units_done}/{self.units_total}" +
+                  f" ----- {record['total_expr_per_sec']} expr/s ----- " +
+                  f"Elapsed: {record['elapsed']}s ----- " +
+                  f"ETA: {record['eta']}s -----]")
+        return record
+
+    def inserted(self, rows:int, seconds:float) -> dict:
+        return self.emit("insert", rows=rows, seconds=round(seconds, 4),
+                         rows_per_sec=round(rows / seconds)
+                             if seconds > 0 else None)
+
+    def committed(self, rows:int, seconds:float) -> dict:
+        return self.emit("commit", rows=rows, seconds=round(seconds, 4))
+
+    def finish(self) -> dict:
+        elapsed = time.time() - self.start_time
+        record = self.emit(
+            "finish", units_done=self.units_done,
+            units_total=self.units_total, candidates=self.candidates,
+            valid=self.valid, elapsed=round(elapsed, 1),
+            expr_per_sec=round(self.candidates / elapsed)
+                if elapsed > 0 else None,
+            valid_rate=round(self.valid / self.candidates, 4)
+                if self.candidates else None)
+        if self.verbose:
+            print(f"done, {self.valid} valid of {self.candidates} " +
+                  f"expressions in {record['elapsed']} seconds")
+        return record
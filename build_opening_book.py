@@ -0,0 +1,155 @@
+import argparse
+import multiprocessing
+import sqlite3
+import time
+
+import numpy as np
+
+import build_metrics # type: ignore
+import expression_store # type: ignore
+import feedback_patterns # type: ignore
+import myutils # type: ignore
+
+# ----- Opening book: precomputed first (and second) guesses -----
+
+# The first guess only depends on the solution value, so it is computed
+# once per value offline with a larger work budget than a live turn gets.
+# With --second the best guess for every feedback pattern of that first
+# guess is stored as well, chosen on exactly the candidates that produce
+# the pattern. Both tables live in opening_book.db:
+#   first_guess   (integer PK, guess, n_candidates)
+#   second_guess  ((integer, pattern) PK, guess, n_candidates)
+
+BOOK_BUDGET = 4 * myutils.ENTROPY_BUDGET
+SEED = 0 # fixed, so a rebuilt book gives the same guesses
+
+def create_tables(conn) -> None:
+    conn.execute("CREATE TABLE IF NOT EXISTS first_guess " +
+                 "(integer INTEGER PRIMARY KEY, guess TEXT NOT NULL, " +
+                 "n_candidates INTEGER NOT NULL)")
+    conn.execute("CREATE TABLE IF NOT EXISTS second_guess " +
+                 "(integer INTEGER NOT NULL, pattern INTEGER NOT NULL, " +
+                 "guess TEXT NOT NULL, n_candidates INTEGER NOT NULL, " +
+                 "PRIMARY KEY (integer, pattern)) WITHOUT ROWID")
+    conn.commit()
+
+def solution_values(db_path:str = myutils.DB_PATH,
+                    store_path:str = expression_store.STORE_PATH) -> list:
+    """All solution values there are expressions for."""
+
+    store = expression_store.open_store(store_path)
+    if store is not None:
+        return store.values.tolist()
+    conn = sqlite3.connect(db_path)
+    values = [row[0] for row in conn.execute(
+        "SELECT DISTINCT integer FROM valid_guesses ORDER BY integer")]
+    conn.close()
+    return values
+
+def best_guess(candidates:np.ndarray, budget:int,
+               rng:np.random.Generator) -> str:
+    row = myutils.select_entropy_guess(candidates, budget, rng)
+    return expression_store.decode_expressions(candidates[row:row + 1])[0]
+
+def book_entries(sol:int, second:bool = False,
+                 budget:int = BOOK_BUDGET) -> tuple:
+    """
+    Computes the book entries of one solution value.
+
+    Args:
+        sol (int): The solution value.
+        second (bool, optional): Also compute the second guesses.
+        budget (int, optional): Work budget per guess, see
+            myutils.select_entropy_guess.
+
+    Returns:
+        tuple: (sol, n_candidates, first guess, second guesses), the first
+            guess is None if sol has no expressions, second guesses is a
+            list of (pattern, guess, n_candidates).
+    """
+
+    rng = np.random.default_rng(SEED)
+    candidates = expression_store.unpack_symbols(
+        myutils.load_packed_expressions(sol))
+    if len(candidates) == 0:
+        return sol, 0, None, []
+    first_guess = best_guess(candidates, budget, rng)
+
+    second_guesses = []
+    if second:
+        patterns = feedback_patterns.pattern_row(first_guess, candidates)
+        order = np.argsort(patterns, kind="stable")
+        starts = np.flatnonzero(np.diff(patterns[order])) + 1
+        for group in np.split(order, starts):
+            pattern = int(patterns[group[0]])
+            if pattern == feedback_patterns.ALL_GREEN:
+                continue
+            second_guesses.append((pattern, best_guess(candidates[group],
+                                                       budget, rng),
+                                   len(group)))
+    return sol, len(candidates), first_guess, second_guesses
+
+def _book_entries_star(args:tuple) -> tuple:
+    start_time = time.perf_counter()
+    return book_entries(*args), time.perf_counter() - start_time
+
+def main(values:list = None, second:bool = False, processes:int = None,
+         book_path:str = myutils.BOOK_PATH, budget:int = BOOK_BUDGET,
+         metrics_path:str = None):
+    """
+    Builds the opening book, values already in the book are skipped.
+
+    Args:
+        values (list of int, optional): Solution values, defaults to all.
+        second (bool, optional): Also store second guesses.
+        processes (int, optional): Worker processes, defaults to the number
+            of cores.
+        book_path (str, optional): The book database.
+        budget (int, optional): Work budget per guess.
+        metrics_path (str, optional): JSON lines file for build metrics.
+    """
+
+    conn = sqlite3.connect(book_path)
+    create_tables(conn)
+    done = {row[0] for row in conn.execute("SELECT integer FROM first_guess")}
+    values = solution_values() if values is None else values
+    values = [sol for sol in values if sol not in done]
+    if len(done) > 0:
+        print(f"{len(done)} values already in the book, {len(values)} left")
+
+    metrics = build_metrics.BuildMetrics(metrics_path,
+                                         units_total=len(values))
+    metrics.start()
+    with multiprocessing.Pool(processes) as pool:
+        for (sol, n_candidates, first_guess, second_guesses), seconds in \
+                pool.imap_unordered(_book_entries_star,
+                                    [(sol, second, budget) for sol in values]):
+            if first_guess is not None:
+                conn.executemany("INSERT OR REPLACE INTO second_guess " +
+                                 "(integer, pattern, guess, n_candidates) " +
+                                 "VALUES (?, ?, ?, ?)",
+                                 [(sol, *entry) for entry in second_guesses])
+                # first guess last: a value counts as done once it is there
+                conn.execute("INSERT OR REPLACE INTO first_guess " +
+                             "(integer, guess, n_candidates) VALUES (?, ?, ?)",
+                             (sol, first_guess, n_candidates))
+                conn.commit()
+            metrics.unit_finished(str(sol), n_candidates,
+                                  int(first_guess is not None), seconds)
+    metrics.finish()
+    conn.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Precompute the opening guesses of every solution value.")
+    parser.add_argument("--values", type=int, nargs="+", default=None)
+    parser.add_argument("--second", action="store_true",
+                        help="also store the best second guess per pattern")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--book", default=myutils.BOOK_PATH)
+    parser.add_argument("--budget", type=int, default=BOOK_BUDGET)
+    parser.add_argument("--metrics", default=None,
+                        help="JSON lines file for the build metrics")
+    args = parser.parse_args()
+    main(args.values, args.second, args.processes, args.book, args.budget,
+         args.metrics)
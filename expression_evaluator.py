@@ -0,0 +1,151 @@
+import re
+from fractions import Fraction
+
+# ----- Exact evaluation of mathler expressions -----
+
+# The grammar is fixed and small: non-negative integer literals, + - * / and
+# brackets. Values are kept as a numerator/denominator pair of Python ints,
+# so there is no rounding anywhere and no float tolerance is needed.
+#   sum     := product (("+" | "-") product)*
+#   product := factor (("*" | "/") factor)*
+#   factor  := number | "(" sum ")"
+
+DIGITS = "0123456789"
+_OPERATOR_SPLIT = re.compile(r"([+\-*/])")
+
+def _parse_factor(expr:str, i:int) -> tuple[int, int, int]:
+    if expr[i] == "(":
+        num, den, i = _parse_sum(expr, i + 1)
+        if i >= len(expr) or expr[i] != ")":
+            raise ValueError(f"unbalanced brackets in {expr}")
+        return num, den, i + 1
+
+    j = i
+    while j < len(expr) and expr[j] in DIGITS:
+        j += 1
+    if j == i or (expr[i] == "0" and j - i > 1): # eval rejects leading zeros
+        raise ValueError(f"no valid number at position {i} of {expr}")
+    return int(expr[i:j]), 1, j
+
+def _parse_product(expr:str, i:int) -> tuple[int, int, int]:
+    num, den, i = _parse_factor(expr, i)
+    while i < len(expr):
+        oper = expr[i]
+        if oper == "*":
+            f_num, f_den, i = _parse_factor(expr, i + 1)
+            num *= f_num
+            den *= f_den
+        elif oper == "/":
+            f_num, f_den, i = _parse_factor(expr, i + 1)
+            if f_num == 0:
+                raise ZeroDivisionError(expr)
+            num *= f_den
+            den *= f_num
+        else:
+            break
+    return num, den, i
+
+def _parse_sum(expr:str, i:int) -> tuple[int, int, int]:
+    num, den, i = _parse_product(expr, i)
+    while i < len(expr):
+        oper = expr[i]
+        if oper == "+":
+            t_num, t_den, i = _parse_product(expr, i + 1)
+            num = num * t_den + t_num * den
+        elif oper == "-":
+            t_num, t_den, i = _parse_product(expr, i + 1)
+            num = num * t_den - t_num * den
+        else:
+            break
+        den *= t_den
+    return num, den, i
+
+def _evaluate_flat(expr:str) -> tuple[int, int]:
+    """Fast path without brackets: a single loop over the operator split."""
+
+    tokens = _OPERATOR_SPLIT.split(expr)
+    for number in tokens[::2]:
+        if not number.isdigit() or (number[0] == "0" and len(number) > 1):
+            raise ValueError(f"no valid number in {expr}")
+
+    num, den = 0, 1 # sum of the finished products
+    t_num, t_den = int(tokens[0]), 1 # product currently being built
+    sign = 1
+    for k in range(1, len(tokens), 2):
+        oper = tokens[k]
+        factor = int(tokens[k + 1])
+        if oper == "*":
+            t_num *= factor
+        elif oper == "/":
+            if factor == 0:
+                raise ZeroDivisionError(expr)
+            t_den *= factor
+        else:
+            num = num * t_den + sign * t_num * den
+            den *= t_den
+            t_num, t_den = factor, 1
+            sign = 1 if oper == "+" else -1
+    return num * t_den + sign * t_num * den, den * t_den
+
+def _evaluate(expr:str) -> tuple[int, int]:
+    if "(" not in expr and ")" not in expr:
+        return _evaluate_flat(expr)
+    num, den, i = _parse_sum(expr, 0)
+    if i != len(expr):
+        raise ValueError(f"unexpected {expr[i]} at position {i} of {expr}")
+    return num, den
+
+def evaluate_expression(expr:str) -> tuple:
+    """
+    Evaluates an expression exactly.
+
+    Args:
+        expr (str): The expression, e.g. "(12+3)*4".
+
+    Returns:
+        tuple: (value, is_valid, is_integer, superfluous_brackets)
+            - value (int or Fraction): None if the expression is invalid.
+            - is_valid (bool): False for syntax errors and divisions by 0.
+            - is_integer (bool): Whether value is an integer.
+            - superfluous_brackets (bool): Whether dropping all brackets
+              leaves the value unchanged, False if there are none.
+    """
+
+    try:
+        num, den = _evaluate(expr)
+    except (ValueError, IndexError, ZeroDivisionError):
+        return None, False, False, False
+
+    is_integer = num % den == 0
+    value = num // den if is_integer else Fraction(num, den)
+
+    superfluous_brackets = False
+    if "(" in expr:
+        try:
+            flat_num, flat_den = _evaluate_flat(expr.replace("(", "")
+                                                .replace(")", ""))
+            superfluous_brackets = flat_num * den == num * flat_den
+        except (ValueError, IndexError, ZeroDivisionError):
+            pass
+
+    return value, True, is_integer, superfluous_brackets
+
+def integer_value(expr:str):
+    """
+    Value of an expression if it is a valid mathler expression.
+
+    Valid means: no division by zero, the result is a non-negative integer
+    and the brackets (if any) are not superfluous.
+
+    Args:
+        expr (str): The expression to evaluate.
+
+    Returns:
+        int: The value, or None if the expression is not valid.
+    """
+
+    value, is_valid, is_integer, superfluous_brackets = \
+        evaluate_expression(expr)
+    if is_valid and is_integer and value >= 0 and not superfluous_brackets:
+        return value
+    return None
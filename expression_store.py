@@ -0,0 +1,190 @@
+import os
+import sqlite3
+
+import numpy as np
+
+# ----- Packed binary store of all valid expressions -----
+
+# Every expression has exactly 8 symbols out of the 16 below, so it fits into
+# a uint32 with 4 bits per symbol (first symbol in the highest nibble).
+# The store consists of three .npy files that are memory-mapped on load:
+#   <path>.expr.npy     uint32 packed expressions, sorted by value
+#   <path>.values.npy   int64  distinct solution values, ascending
+#   <path>.offsets.npy  int64  expressions of values[i] are
+#                              expr[offsets[i]:offsets[i+1]]
+
+SYMBOLS = "0123456789+-*/()"
+EXPR_LEN = 8
+STORE_PATH = 'valid_guesses'
+
+_SHIFTS = np.arange(4 * (EXPR_LEN - 1), -1, -4, dtype=np.uint32)
+_SYMBOL_BYTES = np.frombuffer(SYMBOLS.encode("ascii"), dtype=np.uint8)
+_ASCII_TO_SYMBOL = np.full(256, 255, dtype=np.uint8)
+_ASCII_TO_SYMBOL[_SYMBOL_BYTES] = np.arange(len(SYMBOLS), dtype=np.uint8)
+
+def encode_expressions(expressions:list) -> np.ndarray:
+    """Converts expression strings into an N x 8 matrix of symbol indices.
+
+    Args:
+        expressions (list of str): Expressions of exactly 8 symbols.
+
+    Returns:
+        np.ndarray: uint8 matrix, entry [i, pos] is the index of the symbol
+            at pos of expression i in SYMBOLS.
+    """
+
+    if len(expressions) == 0:
+        return np.empty((0, EXPR_LEN), dtype=np.uint8)
+    raw = np.frombuffer("".join(expressions).encode("ascii"), dtype=np.uint8)
+    if raw.size != len(expressions) * EXPR_LEN:
+        raise ValueError(f"all expressions need exactly {EXPR_LEN} symbols")
+    symbols = _ASCII_TO_SYMBOL[raw].reshape(-1, EXPR_LEN)
+    if (symbols == 255).any():
+        raise ValueError(f"expressions may only contain {SYMBOLS}")
+    return symbols
+
+def decode_expressions(symbols:np.ndarray) -> list:
+    """Converts an N x 8 symbol matrix back into expression strings."""
+
+    ascii_matrix = np.ascontiguousarray(_SYMBOL_BYTES[symbols])
+    return ascii_matrix.view(f"S{EXPR_LEN}").ravel().astype(str).tolist()
+
+def count_symbols(symbols:np.ndarray) -> np.ndarray:
+    """Counts the symbols of every row of an N x 8 symbol matrix.
+
+    Returns:
+        np.ndarray: N x 16 uint8 matrix, entry [i, k] is how often SYMBOLS[k]
+            occurs in expression i.
+    """
+
+    counts = np.zeros((len(symbols), len(SYMBOLS)), dtype=np.uint8)
+    rows = np.arange(len(symbols))
+    # one position at a time: no row appears twice, so += is safe
+    for pos in range(symbols.shape[1]):
+        counts[rows, symbols[:, pos]] += 1
+    return counts
+
+def pack_symbols(symbols:np.ndarray) -> np.ndarray:
+    """Packs an N x 8 symbol matrix into N uint32 (4 bits per symbol)."""
+
+    return np.bitwise_or.reduce(symbols.astype(np.uint32) << _SHIFTS, axis=1)
+
+def unpack_symbols(packed:np.ndarray) -> np.ndarray:
+    """Unpacks N uint32 into an N x 8 symbol matrix."""
+
+    packed = np.asarray(packed, dtype=np.uint32)
+    return ((packed[:, None] >> _SHIFTS) & 0xF).astype(np.uint8)
+
+def pack_expressions(expressions:list) -> np.ndarray:
+    """Packs expression strings into uint32."""
+
+    return pack_symbols(encode_expressions(expressions))
+
+def unpack_expressions(packed:np.ndarray) -> list:
+    """Unpacks uint32 into expression strings."""
+
+    return decode_expressions(unpack_symbols(packed))
+
+def store_files(path:str) -> tuple[str, str, str]:
+    return f"{path}.expr.npy", f"{path}.values.npy", f"{path}.offsets.npy"
+
+def store_exists(path:str = STORE_PATH) -> bool:
+    return all(os.path.exists(file) for file in store_files(path))
+
+def write_store(values:np.ndarray, packed:np.ndarray,
+                path:str = STORE_PATH, is_sorted:bool = False) -> None:
+    """Writes a packed store.
+
+    Args:
+        values (np.ndarray): Solution value of every expression.
+        packed (np.ndarray): Packed expressions, same length as values.
+        path (str): Path prefix of the three store files.
+        is_sorted (bool): Set if values is already ascending, which skips
+            the sort.
+    """
+
+    values = np.asarray(values, dtype=np.int64)
+    packed = np.asarray(packed, dtype=np.uint32)
+    assert len(values) == len(packed)
+
+    if not is_sorted:
+        order = np.lexsort((packed, values))
+        values = values[order]
+        packed = packed[order]
+
+    starts = np.flatnonzero(np.diff(values)) + 1
+    distinct_values = values[np.concatenate(([0], starts))] if len(values) \
+        else np.empty(0, dtype=np.int64)
+    offsets = np.concatenate(([0], starts, [len(values)])).astype(np.int64) \
+        if len(values) else np.zeros(1, dtype=np.int64)
+
+    expr_file, values_file, offsets_file = store_files(path)
+    # offsets last: a store without it is incomplete and not picked up
+    np.save(expr_file, packed)
+    np.save(values_file, distinct_values)
+    np.save(offsets_file, offsets)
+
+def export_store_from_db(db_path:str, path:str = STORE_PATH,
+                         chunk_size:int = 1_000_000) -> None:
+    """Converts the valid_guesses SQLite table into a packed store.
+
+    The table is clustered on (integer, string), so reading it in key order
+    already yields the rows sorted by value.
+    """
+
+    conn = sqlite3.connect(db_path)
+    n_rows = conn.execute("SELECT COUNT(*) FROM valid_guesses").fetchone()[0]
+    values = np.empty(n_rows, dtype=np.int64)
+    packed = np.empty(n_rows, dtype=np.uint32)
+
+    c = conn.execute("SELECT integer, string FROM valid_guesses " +
+                     "ORDER BY integer")
+    n_read = 0
+    while True:
+        rows = c.fetchmany(chunk_size)
+        if not rows:
+            break
+        chunk_values, chunk_expr = zip(*rows)
+        values[n_read:n_read + len(rows)] = chunk_values
+        packed[n_read:n_read + len(rows)] = pack_expressions(chunk_expr)
+        n_read += len(rows)
+    conn.close()
+
+    write_store(values[:n_read], packed[:n_read], path, is_sorted=True)
+
+class ExpressionStore:
+    """Read-only, memory-mapped view on a packed store."""
+
+    def __init__(self, path:str = STORE_PATH):
+        expr_file, values_file, offsets_file = store_files(path)
+        self.packed = np.load(expr_file, mmap_mode="r")
+        self.values = np.load(values_file)
+        self.offsets = np.load(offsets_file)
+
+    def _find(self, sol:int) -> int:
+        i = int(np.searchsorted(self.values, sol))
+        if i < len(self.values) and self.values[i] == sol:
+            return i
+        return -1
+
+    def __contains__(self, sol:int) -> bool:
+        return self._find(int(sol)) >= 0
+
+    def load(self, sol:int) -> np.ndarray:
+        """Packed expressions equal to sol, a zero-copy slice of the map."""
+
+        i = self._find(int(sol))
+        if i < 0:
+            return self.packed[0:0]
+        return self.packed[self.offsets[i]:self.offsets[i + 1]]
+
+_open_stores = {}
+
+def open_store(path:str = STORE_PATH):
+    """Returns the store at path (opened once per process) or None."""
+
+    if path not in _open_stores:
+        if not store_exists(path):
+            return None
+        _open_stores[path] = ExpressionStore(path)
+    return _open_stores[path]
@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+from numba import njit, prange
+
+import expression_store # type: ignore
+
+# ----- Feedback patterns of guesses against candidate expressions -----
+
+# The response to a guess is one colour per position, stored as a base-3
+# code with the first position as the most significant digit:
+#   code = sum(colour[pos] * 3**(7 - pos)),  dark = 0, yellow = 1, green = 2
+# so every pattern fits into a uint16 (3**8 = 6561 patterns). Repeated
+# symbols follow the usual rules: greens are taken first, then the yellows
+# from left to right as long as the candidate has unmatched copies left.
+
+DARK, YELLOW, GREEN = 0, 1, 2
+COLOURS = ("dark", "yellow", "green")
+N_PATTERNS = 3 ** expression_store.EXPR_LEN
+ALL_GREEN = N_PATTERNS - 1
+N_SYMBOLS = len(expression_store.SYMBOLS)
+
+_BLOCK_SIZE = 4096 # candidates per parallel block
+# the kernel already uses all cores, and numba's workqueue threading layer
+# aborts if two threads launch parallel kernels at the same time
+_kernel_lock = threading.Lock()
+
+@njit(nogil=True, cache=True)
+def _pattern_code(guesses:np.ndarray, g:int, candidates:np.ndarray, c:int,
+                  counts:np.ndarray) -> int:
+    """Pattern of guess g against candidate c, counts is scratch space."""
+
+    n_pos = guesses.shape[1]
+    counts[:] = 0
+    for pos in range(n_pos):
+        if guesses[g, pos] != candidates[c, pos]:
+            counts[candidates[c, pos]] += 1
+
+    code = 0
+    for pos in range(n_pos):
+        code *= 3
+        sym = guesses[g, pos]
+        if sym == candidates[c, pos]:
+            code += GREEN
+        elif counts[sym] > 0:
+            code += YELLOW
+            counts[sym] -= 1
+    return code
+
+@njit(parallel=True, nogil=True, cache=True)
+def _pattern_kernel(guesses:np.ndarray, candidates:np.ndarray,
+                    out:np.ndarray) -> None:
+    # parallel over candidate blocks, so a single guess against millions of
+    # candidates uses all cores just like many guesses do
+    n_candidates = candidates.shape[0]
+    n_blocks = (n_candidates + _BLOCK_SIZE - 1) // _BLOCK_SIZE
+    for b in prange(n_blocks):
+        counts = np.zeros(N_SYMBOLS, dtype=np.int8)
+        start = b * _BLOCK_SIZE
+        stop = min(start + _BLOCK_SIZE, n_candidates)
+        for g in range(guesses.shape[0]):
+            for c in range(start, stop):
+                out[g, c] = _pattern_code(guesses, g, candidates, c, counts)
+
+def _as_symbol_matrix(expressions) -> np.ndarray:
+    if isinstance(expressions, str):
+        expressions = [expressions]
+    if isinstance(expressions, (list, tuple)):
+        return expression_store.encode_expressions(list(expressions))
+    return np.ascontiguousarray(np.atleast_2d(expressions), dtype=np.uint8)
+
+def pattern_matrix(guesses, candidates) -> np.ndarray:
+    """
+    Feedback patterns of every guess against every candidate.
+
+    Args:
+        guesses: Expression string(s) or a symbol matrix (G x 8, or one row
+            of 8).
+        candidates: Expression strings or a symbol matrix (N x 8).
+
+    Returns:
+        np.ndarray: G x N uint16 matrix of pattern codes, entry [g, c] is
+            the feedback guess g gets if candidate c is the solution.
+    """
+
+    guesses = _as_symbol_matrix(guesses)
+    candidates = _as_symbol_matrix(candidates)
+    out = np.empty((len(guesses), len(candidates)), dtype=np.uint16)
+    if out.size > 0:
+        with _kernel_lock:
+            _pattern_kernel(guesses, candidates, out)
+    return out
+
+def pattern_row(guess, candidates) -> np.ndarray:
+    """Patterns of one guess against all candidates (N uint16 codes)."""
+
+    return pattern_matrix(guess, candidates)[0]
+
+def encode_pattern(feedback) -> int:
+    """
+    Pattern code of one feedback.
+
+    Args:
+        feedback: List of colour names ("dark", "yellow", "green") as used by
+            SolutionFilter._apply_feedback, or a string like "ggdydydg".
+
+    Returns:
+        int: The base-3 pattern code.
+
+    Raises:
+        ValueError: If feedback is not exactly 8 colours.
+    """
+
+    feedback = list(feedback)
+    if len(feedback) != expression_store.EXPR_LEN:
+        raise ValueError(f"feedback needs exactly {expression_store.EXPR_LEN} "
+                         + f"colours, got {len(feedback)}")
+    code = 0
+    for colour in feedback:
+        if colour not in COLOURS and colour not in ("d", "y", "g"):
+            raise ValueError(f"unknown colour {colour!r}")
+        code = 3 * code + "dyg".index(colour[0])
+    return code
+
+def decode_pattern(code:int) -> list:
+    """Colour names of a pattern code, inverse of encode_pattern."""
+
+    colours = []
+    for _ in range(expression_store.EXPR_LEN):
+        code, colour = divmod(int(code), 3)
+        colours.append(COLOURS[colour])
+    return colours[::-1]
+
+def feedback_for(guess:str, solution:str) -> list:
+    """Colour names the game shows for guess if solution is hidden."""
+
+    return decode_pattern(pattern_matrix(guess, solution)[0, 0])
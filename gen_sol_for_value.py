@@ -1,1033 +1,652 @@
+import threading
+
 import numpy as np
 from numba import njit
 import time
-import itertools
 
-@njit
+import expression_evaluator # type: ignore
+import expression_store # type: ignore
+
+# ----- Numba kernels -----
+
+# All kernels live at module level, so they are compiled once per process
+# instead of once per call, and cache=True stores the machine code next to
+# the module (__pycache__), so a restarted process only loads it. warm_up()
+# compiles (or loads) all of them up front.
+
+@njit(cache=True)
 def _digit(n:int) -> int:
     if n < 1:
         return -1
     else:
         return int(np.floor(np.log10(n)+1))
     
-@njit
-def _find_all_mul_for_sol(sol:int, expr_len:int, prefix:str, postfix:str, 
-                         multiply_com_num:int = 1) -> list:
+# ----- Divisor sieve -----
+
+# The ways to write a value as a product of two factors with a given amount
+# of digits (the x * y kernel and divisor_pairs) come from one
+# smallest-prime-factor sieve over every value an expression can reach
+# (below 10**7: at most 999999*9), built on first use. A value factors in a
+# few table lookups and its divisors follow from the prime powers, so no
+# trial division and no membership checks on partitions are needed.
+
+SIEVE_LIMIT = 10**7
+
+_spf = None
+_sieve_lock = threading.Lock()
+
+@njit(cache=True)
+def _sieve(limit:int) -> np.ndarray:
+    spf = np.zeros(limit, dtype=np.int32)
+    for i in range(2, limit):
+        if spf[i] == 0:
+            spf[i] = i
+            for j in range(i*i, limit, i):
+                if spf[j] == 0:
+                    spf[j] = i
+    return spf
+
+@njit(cache=True)
+def _smallest_factor(n:int, spf:np.ndarray) -> int:
+    if n < len(spf):
+        return spf[n]
+    p = 2 # beyond the sieve, only reached by direct calls
+    while p * p <= n:
+        if n % p == 0:
+            return p
+        p += 1
+    return n
+
+@njit(cache=True)
+def _divisors(n:int, spf:np.ndarray) -> np.ndarray:
+    """All divisors of n >= 1 in ascending order."""
+
+    divisors = np.ones(1, dtype=np.int64)
+    rest = n
+    while rest > 1:
+        p = _smallest_factor(rest, spf)
+        k = 0
+        while rest % p == 0:
+            rest //= p
+            k += 1
+        n_div = len(divisors)
+        extended = np.empty(n_div * (k + 1), dtype=np.int64)
+        power = 1
+        for e in range(k + 1):
+            extended[e*n_div:(e+1)*n_div] = divisors * power
+            power *= p
+        divisors = extended
+    return np.sort(divisors)
+
+@njit(cache=True)
+def _divisor_pairs(n:int, n_digits:int, spf:np.ndarray) -> np.ndarray:
+    divisors = _divisors(n, spf)
+    out = np.empty((len(divisors), 3), dtype=np.int64)
+    k = 0
+    for x in divisors:
+        y = n // x
+        if _digit(x) + _digit(y) == n_digits:
+            out[k, 0] = x
+            out[k, 1] = y
+            out[k, 2] = 1 if x == y else 2
+            k += 1
+    return out[:k]
+
+def smallest_prime_factors() -> np.ndarray:
+    """The shared sieve, entry n is the smallest prime factor of n (n >= 2)."""
+
+    global _spf
+    with _sieve_lock:
+        if _spf is None:
+            _spf = _sieve(SIEVE_LIMIT)
+    return _spf
+
+def divisor_pairs(value:int, n_digits:int) -> np.ndarray:
     """
-    Generates math expr with one operator of the form x * y.
+    Ordered factorizations value = x * y with x, y >= 1.
 
     Args:
-        solution (int): The solution the operator should equal
-        expr_len (int) : Length of expression: len("x*y")
-        prefix (str): prefix to be added to the start of the expression
-        postfix (str): postfix to be added to the end of the expression
-        multiply_com_num (int): multiply com_sol, based on comb of others
+        value (int): The product.
+        n_digits (int): Digits of x and y together.
 
-    Returns: list filled with tuples (prefix + "x+y" + postfix, n),
-        expr_len = length of "x*y", n = amount of commutative solutions
+    Returns:
+        np.ndarray: K x 3 int64 rows (x, y, n), n = amount of commutative
+            solutions (1 if x == y, else 2).
     """
 
+    if value < 1:
+        return np.empty((0, 3), dtype=np.int64)
+    return _divisor_pairs(value, n_digits, smallest_prime_factors())
+
+# The one operator kernels return (x, y, n) tuples, n = amount of
+# commutative solutions, _gen_one_op turns them into strings.
+
+@njit(cache=True)
+def _gen_one_plus(sol:int) -> list:
+    """Generates math expressions of the form x + y = sol."""
+
+    # (sol min, sol max, x min, y max, unused, x max, y min), x is the operand
+    # with more digits
+    ranges = [
+        (1100, 10998, 1000, 999, 99, 9999, 100),
+        (10010, 100098, 10000, 99, 9, 99999, 10),
+        (100001, 1000008, 100000, 9, 0, 999999, 1)
+    ]
+    
+    expressions = []
+
+    for range_ in ranges:
+        RANGE_MIN, RANGE_MAX, x_low, x_high, _, y_high, y_low = range_
+        if RANGE_MIN <= sol <= RANGE_MAX:
+            x_min = max((x_low, int(np.ceil(sol/2)), sol-x_high))
+            x_max = min(y_high,sol-y_low)
+
+            for x in range(x_min, x_max + 1):
+                y = sol - x # x == y impossible due to digit sum
+                expressions.append((x, y, 2))
+                expressions.append((y, x, 2))
+
+    return expressions
+
+@njit(cache=True)
+def _gen_one_minus(sol:int) -> list:
+    """Generates math expr with one operator of the form x - y."""
+
+    x_min = max((1000, sol+1))
+    expressions = []
+
+    for x in range(x_min,1_000_000):
+        y = x - sol
+        digits = _digit(x) + _digit(y)
+        if digits == 7:
+            expressions.append((x,y,1))
+        elif digits > 7:
+            break
+
+    return expressions
+
+def _gen_one_mul(sol:int) -> np.ndarray:
+    """Generates math expr with one operator of the form x * y."""
+
+    return divisor_pairs(sol, 7)
+
+@njit(cache=True)
+def _gen_one_div(sol:int) -> list:
+    """Generates math expr with one operator of the form x / y."""
+
+    # sol = x/y --> x = sol * y 
+    y = 1
+    x = sol*y
     results = []
-    sol_red = sol
-    factors = []
-    max_iter = int(np.floor(np.sqrt(sol_red)))
-    for iter in range(2,max_iter+1):
-        while sol_red % iter == 0:
-            factors.append(iter)
-            sol_red //= iter
-    if sol_red > 1: # sol is prime
-        factors.append(sol_red)    
-    # Now we have the prime factorization
-
-    # Generate all partitions using bitmasking
-    len_factors = len(factors)
-    expr = []
-
-    for bitmask in range(1, 2**len_factors):
-        part1_primes = []
-        part2_primes = []
-        
-        for i in range(len_factors):
-            if bitmask & (1 << i):
-                part1_primes.append(factors[i])
-            else:
-                part2_primes.append(factors[i])
-        
-        # Calculate product of each partition
-        x = 1
-        y = 1
-        
-        for prime in part1_primes:
-            x *= prime
-        
-        for prime in part2_primes:
-            y *= prime
-        
-        # Check if y * z = x
-        assert x * y == sol
-        if expr_len == _digit(x)+_digit(y)+1 and (x,y) not in expr:
-            if x == y and x != 1 and y != 1:
-                results.append((f"{prefix}{x}*{y}{postfix}",1*multiply_com_num))
-            elif x != y and x != 1 and y != 1:
-                results.append((f"{prefix}{x}*{y}{postfix}",2*multiply_com_num))
-            expr.append((x,y))
-
-    return results 
-
-def _gen_one_op(solution:int) -> np.ndarray:
+    while _digit(x) + _digit(y) <= 7:
+        if _digit(x) + _digit(y) == 7:
+            results.append((x,y,1))
+        y += 1
+        x = sol*y
+
+    return results
+
+_ONE_OP_KERNELS = (('+', _gen_one_plus), ('-', _gen_one_minus),
+                   ('*', _gen_one_mul), ('/', _gen_one_div))
+
+def warm_up() -> None:
+    """
+    Compiles all numba kernels of this module, or loads them from the on-disk
+    cache, and builds the divisor sieve and the subexpression index, so that
+    the first generated value does not pay for it. Call it once per process,
+    e.g. in a pool initializer.
+    """
+
+    _digit(1)
+    divisor_pairs(12, 2)
+    _subexpression_index()
+    for _, kernel in _ONE_OP_KERNELS:
+        kernel(12)
+
+def _gen_one_op(solution:int) -> list:
     """
     Generates math expr with one operator of the form x oper y.
 
     Args:
         solution (int): The solution the operator should equal
 
-    Returns:
-        ... not sure yet
+    Returns: list filled with tuples ("x oper y", n),
+        n = amount of commutative solutions
     """
-    @njit
-    def gen_one_plus(sol: int):
-        """
-        Generates math expressions of the form x + y = sol.
-        """
-
-        ranges = [
-            (1100, 10998, 1000, 999, 99, 9999, 100),
-            (10010, 100098, 10000, 99, 9, 99999, 10),
-            (100001, 1000008, 100000, 9, 0, 999999, 1)
-        ]
-        
-        expressions = []
-
-        for range_ in ranges:
-            RANGE_MIN, RANGE_MAX, x_low, x_high, x_low, y_high, y_low = range_
-            if RANGE_MIN <= sol <= RANGE_MAX:
-                #x_min = np.max(np.array([x_low, int(np.ceil(sol/2)),
-                                         #sol-x_high]))
-                #x_max = np.min(np.array([y_high,sol-y_low]))
-                x_min = max((x_low, int(np.ceil(sol/2)), sol-x_high))
-                x_max = min(y_high,sol-y_low)
-
-                for x in range(x_min, x_max + 1):
-                    y = sol - x # x == y impossible due to digit sum
-                    expressions.append((x, y, 2))
-                    expressions.append((y, x, 2))
-
-        return expressions
-    
-    @njit
-    def gen_one_minus(sol:int):
-        """Generates math expr with one operator of the form x - y."""
-
-        x_min = max((1000, sol+1))
-        expressions = []
-
-        for x in range(x_min,999_999):
-            y = x - sol
-            digits = _digit(x) + _digit(y)
-            if digits == 7:
-                expressions.append((x,y,1))
-            elif digits > 7:
-                break
-
-        return expressions # here only x and y, coerse into string
-    
-    @njit
-    def gen_one_mul(sol:int):
-        """
-        Generates math expr with one operator of the form x * y.
-
-        Args:
-            solution (int): The solution the operator should equal
-        """
-        results = []
-        com_sol_num = []
-
-        sol_red = sol
-        factors = []
-        max_iter = int(np.floor(np.sqrt(sol_red)))
-        for iter in range(2,max_iter+1):
-            while sol_red % iter == 0:
-                factors.append(iter)
-                sol_red //= iter
-        if sol_red > 1: # sol is prime
-            factors.append(sol_red)
-        
-        # Now we have the prime factorization
-
-            # Generate all partitions using bitmasking
-
-        len_factors = len(factors)
-        for bitmask in range(1, 2**len_factors):
-            part1_primes = []
-            part2_primes = []
-            
-            for i in range(len_factors):
-                if bitmask & (1 << i):
-                    part1_primes.append(factors[i])
-                else:
-                    part2_primes.append(factors[i])
-            
-            # Calculate product of each partition
-            x = 1
-            y = 1
-            
-            for prime in part1_primes:
-                x *= prime
-            
-            for prime in part2_primes:
-                y *= prime
-            
-            # Check if y * z = x
-            assert x * y == sol
-            if x == y and x != 1 and y != 1:
-                results.append((x, y, 1))
-                com_sol_num.append(1)
-            elif x != y and x != 1 and y != 1:
-                results.append((y, x, 2))
-                com_sol_num.append(2)
-
-        return results, com_sol_num
-    
-    @njit
-    def gen_one_div(sol):
-        """
-        Generates math expr with one operator of the form x * y. Numba is used
-        to run the code at (rougly) C speed
-
-        Args:
-            solution (int): The solution the operator should equal
-        """
-
-        # sol = x/y --> x = sol * y 
-        y = 2
-        x = sol*y
-        results = []
-        while _digit(x) + _digit(y) <= 7:
-            if (int(np.log10(x))+1 + int(np.log10(y))+1) == 7:
-                results.append((x,y,1))
-            y += 1
-            x = sol*y
-
-        return results
-
-    # Todo change these into: str + number of commutative solutions
-
-    @njit
-    def gen_expr(ma_plus, oper:str, sol:int):
-        ma_plus = gen_one_plus(sol)
-        first_elements = np.array([tup[0] for tup in ma_plus])
-        second_elements = np.array([tup[1] for tup in ma_plus])
-        third_elements = np.array([tup[2] for tup in ma_plus])
-        expr = []
-        com_count = []
-        for i in range(len(first_elements)):
-            expr.append(f"{first_elements[i]}{oper}{second_elements[i]}")
-            com_count.append(third_elements[i])
-        return expr, com_count
-
-    def safe_gen_expr(gen_func, oper:str, sol:int):
-        expr, com_count = [], []
-        if gen_func(sol):
-            expr, com_count = gen_expr(gen_func, oper, sol)
-        return expr, com_count
-    
-    #expr, com_count = safe_gen_expr(gen_one_plus, "+", solution)
-    #expr_min, com_count_min = safe_gen_expr(gen_one_minus, "-", solution)
-    #expr_mul, com_count_mul = safe_gen_expr(gen_one_mul, "*", solution)
-    #expr_div, com_count_div = safe_gen_expr(gen_one_div, "/", solution)
 
-    operations = [('+', gen_one_plus), ('-', gen_one_minus),
-                  ('*', gen_one_mul), ('/', gen_one_div)]
-    
-    all_expr = []
-    all_com_count = []
-    for oper, gen_func in operations:
-        expr, com_count = safe_gen_expr(gen_func, oper, solution)
-        all_expr.extend(expr)
-        all_com_count.extend(com_count)
-
-    assert len(all_expr) == len(all_com_count)
-    
-    return all_expr
-        
+    if solution < 1:
+        return []
+    return [(f"{x}{oper}{y}", n)
+            for oper, kernel in _ONE_OP_KERNELS
+            for x, y, n in kernel(solution)]
+
 # ============================================================================ #
 
-def _gen_two_oper(sol:int):
-    
-    def gen_plus_plus(sol): 
-        results = []
-
-        #Case: xxxx + y + z = sol
-        if 1002 <= sol <= 10017: # xxxx + y + z
-            for y in range(1,10):
-                for z in range(y,10): # z > y -> no duplicates
-                    x = sol - y - z
-                    if _digit(x) == 4:
-                        if y == z:
-                            results.extend([
-                                (f"{x}+{y}+{y}", 3),
-                                (f"{y}+{x}+{y}", 3),
-                                (f"{y}+{y}+{x}", 3)
-                            ])
-                        else:
-                            results.extend([
-                                (f"{x}+{y}+{z}", 6),
-                                (f"{x}+{z}+{y}", 6),
-                                (f"{y}+{x}+{z}", 6),
-                                (f"{y}+{z}+{x}", 6),
-                                (f"{z}+{x}+{y}", 6),
-                                (f"{z}+{y}+{x}", 6)
-                            ])
-        # Case: xxx + yy + z
-        if 120 <= sol <= 1197: 
-            for x in range(max(1,sol-99-999),min(10, sol-10-100+1)):
-                for y in range(max(10,sol-x-999),min(100,sol-x-100+1)):
-                    z = sol - x - y
-                    if _digit(z) == 3:
-                        results.extend([
-                            (f"{x}+{y}+{z}", 6),
-                            (f"{x}+{z}+{y}", 6),
-                            (f"{y}+{x}+{z}", 6),
-                            (f"{y}+{z}+{x}", 6),
-                            (f"{z}+{x}+{y}", 6),
-                            (f"{z}+{y}+{x}", 6)
-                        ])
-    
-        # Case: xx + yy + zz
-        if 30 <= sol <= 297:
-            for x in range(max(10,sol-99-99), min(100,sol-10-10+1)):
-                for y in range(max(x,sol-x-99), min(100,sol-10-x+1)):
-                    z = sol - x - y
-                    if _digit(z) == 2 and z > y: # second cond avoids duplicates
-                        if x != y and y != z and x != z:
-                           results.extend([
-                                (f"{x}+{y}+{z}", 6),
-                                (f"{x}+{z}+{y}", 6),
-                                (f"{y}+{x}+{z}", 6),
-                                (f"{y}+{z}+{x}", 6),
-                                (f"{z}+{x}+{y}", 6),
-                                (f"{z}+{y}+{x}", 6)
-                            ])
-                        elif x == y and y == z:
-                            results.append((f"{x}+{y}+{z}", 1))
-                        elif x == y:
-                            results.extend([
-                                (f"{z}+{x}+{x}", 3),
-                                (f"{x}+{z}+{x}", 3),
-                                (f"{x}+{x}+{z}", 3)
-                            ])
-                        elif y == z:
-                            results.extend([
-                                (f"{x}+{z}+{z}", 3),
-                                (f"{z}+{x}+{z}", 3),
-                                (f"{z}+{z}+{x}", 3)
-                            ])
-                        elif x == z:
-                            results.extend([
-                                (f"{y}+{x}+{x}", 3),
-                                (f"{x}+{y}+{x}", 3),
-                                (f"{x}+{x}+{y}", 3)
-                            ])
-        return results
-        
-    def gen_plus_min(sol):
-        results = []
-
-        # Case: xxxx + y - z
-        if 992 <= sol <= 10007:
-            for x in range(1,10): # the negative number
-                for y in range(x,10):
-                    z = sol + x - y
-                    if _digit(z) == 4:
-                        results.extend([
-                            (f"{z}+{y}-{x}", 4),
-                            (f"{y}+{z}-{x}", 4),
-                            (f"{z}-{x}+{y}", 4),
-                            (f"{y}-{x}+{z}", 4)
-                        ])
-        # Case: xxx + yy - z
-        if 101 <= sol <= 1097:
-            for x in range(1,10): #the negative number
-                for y in range(10,100):
-                    z = sol + x - y
-                    if _digit(z) == 3:
-                        results.extend([
-                            (f"{z}+{y}-{x}", 4),
-                            (f"{y}+{z}-{x}", 4),
-                            (f"{z}-{x}+{y}", 4),
-                            (f"{y}-{x}+{z}", 4)
-                        ])
-        # Case: xxx - yy + z
-        if 2 <= sol <= 998:
-            for y in range(1,10):
-                for x in range(10,100): # the negative number
-                    z = sol + x - y
-                    if _digit(z) == 3:
-                        results.extend([
-                            (f"{z}+{y}-{x}", 4),
-                            (f"{y}+{z}-{x}", 4),
-                            (f"{z}-{x}+{y}", 4),
-                            (f"{y}-{x}+{z}", 4)
-                        ])
-        # Case: xx + yy - zz
-        if sol <= 188:
-            for x in range(10,100): 
-                for y in range(x,100):
-                    z = x + y - sol
-                    if _digit(z) == 2:
-                        if x != y:
-                            results.extend([
-                                (f"{x}-{y}-{z}", 4),
-                                (f"{y}+{x}-{z}", 4),
-                                (f"{x}-{z}+{y}", 4),
-                                (f"{y}-{z}+{x}", 4)
-                            ])
-                        else:                            
-                            results.extend([
-                                (f"{x}-{x}-{z}", 4),
-                                (f"{x}-{z}+{x}", 4)
-                            ])
-
-        # Case: xx + y - zzz
-        if sol <= 8:
-            for z in range(100,108+1): # The negative number
-                for y in range(1,10):
-                    x = sol - y + z
-                    if _digit(x) == 2:
-                        results.extend([
-                            (f"{z}+{y}-{x}", 4),
-                            (f"{y}+{z}-{x}", 4),
-                            (f"{z}-{x}+{y}", 4),
-                            (f"{y}-{x}+{z}", 4)
-                        ])
-        return results
-    
-    def gen_min_min(sol):
-        # sol = x - y - z
-        results = []
-        
-        # Case: xxxx-y-z
-        if 988 <= sol <= 9997:
-            for z in range(1,10):
-                for y in range(z,10):
-                    x = sol + y + z
-                    if _digit(x) == 4 and y != z:
-                        results.append((f"{x}-{y}-{z}", 2))
-                        results.append((f"{x}-{z}-{y}", 2))
-                    elif _digit(x) == 4 and y == z:
-                        results.append((f"{x}-{y}-{z}", 1))
-        # Case: xxx - yy - z
-        if sol <= 988:
-            for z in range(1,10):
-                for y in range(10,100):
-                    x = sol + y + z
-                    if _digit(x) == 3:
-                        results.append((f"{x}-{y}-{z}", 2))
-                        results.append((f"{x}-{z}-{y}", 2))
-        # Case: xx - yy - zz
-        if sol <= 79:
-            for z in range(10,89-sol+1):
-                for y in range(z,99-z-sol+1):
-                    x = sol + y + z
-                    if _digit(x) == 2 and y != z:
-                        results.append((f"{x}-{y}-{z}", 2))
-                        results.append((f"{x}-{z}-{y}", 2))
-                    elif _digit(x) == 2 and y == z:
-                        results.append((f"{x}-{y}-{z}", 1))
-        return results
-    
-    def gen_plus_mul(sol):
-        results = []
-
-        # Case: xxxx*y+z and xxx*yy+z
-        if 1001 <= sol <= 98910:
-            for z in range(1,10):
-                results.extend(_find_all_mul_for_sol(sol-z, 6, f"{z}+","",2))
-                results.extend(_find_all_mul_for_sol(sol-z, 6, "",f"+{z}",2))
-
-        # Case: xxx*y+zz and xx*yy+zz
-        if 110 <= sol <= 9900:
-            for z in range(10,100):
-                results.extend(_find_all_mul_for_sol(sol-z, 5, f"{z}+","",2))
-                results.extend(_find_all_mul_for_sol(sol-z, 5, "",f"+{z}",2))
-        
-        # Case: xx*y+zzz
-        if 120 <= sol <= 1890:
-            for y in range(2,10):
-                for x in range(10,100):
-                    xy = x*y
-                    if xy > sol-100:
-                        break
-                    z = sol-xy
-                    if 100 <= z <= 999:
-                        results.extend([
-                            (f"{x}*{y}+{z}", 4),
-                            (f"{y}*{x}+{z}", 4),
-                            (f"{z}+{x}*{y}", 4),
-                            (f"{z}+{y}*{x}", 4)
-                        ])
-
-        # Case: x*y+zzzz
-        if 1004 <= sol <= 10080:
-            for x in range(2,10):
-                for y in range(x,10):
-                    z = sol-x*y
-                    if 1000 <= z <= 9999:
-                        if x != y:
-                            results.extend([
-                                (f"{x}*{y}+{z}", 4),
-                                (f"{y}*{x}+{z}", 4),
-                                (f"{z}+{x}*{y}", 4),
-                                (f"{z}+{y}*{x}", 4)
-                            ])
-                        else:
-                            results.extend([
-                                (f"{x}*{x}+{z}", 2),
-                                (f"{z}+{x}*{x}", 2)
-                            ])
-        return results
-
-    def gen_min_mul(sol):
-        results = []
-
-        # Case: xxxx*y-z and xxx*yy-z
-        if 991 <= sol <= 98900:
-            for z in range(1,10):
-                results.extend(_find_all_mul_for_sol(sol+z, 6, "",f"-{z}",1))
-
-        # Case: xx*yy-zz and xxx*y-zz
-        if 0 <= sol <= 9791:
-            for z in range(10,100):
-                results.extend(_find_all_mul_for_sol(sol+z, 5, "",f"-{z}",1))
-
-        # Case: xx*y-zzz --> sol + zzz = xx*y
-        if 0 <= sol <= 791:
-            for y in range(2,10):
-                for x in reversed(range(10,100)):
-                    xy = x*y
-                    if xy < sol+100: #if x*y < sol + min(zzz) --> early exit
-                        break
-                    z = xy-sol
-                    if 100 <= z <= 999:
-                        results.extend([
-                            (f"{x}*{y}-{z}", 2),
-                            (f"{y}*{x}-{z}", 2)
-                        ])
-
-        # Case: x*y-zzzz --> not possible with pos solutions!
-
-        return results
-
-    def gen_div_plus(sol):
-        # Case: all x/y+z
-        results = []
-        for y in reversed(range(2,100)): # The divisor
-            x = y
-            while (x/y+1 <= sol):
-                z = int(sol-x/y)
-                if _digit(x) + _digit(y) + _digit(z) == 6:
-                    results.extend([
-                        (f"{x}/{y}+{z}", 2),
-                        (f"{z}+{x}/{y}", 2),
-                    ])
-                x += y
-        return results
-
-    def gen_div_min(sol):
-        # Case: all sol = x/y-z --> z = x/y-sol --> x/y = z+sol
-        results = []
-        for y in reversed(range(2,100)): # The divisor
-            x = y
-            while (x/y - sol <= 499): # Biggest z can be is in xxx/y-zzz
-                z = int(x/y-sol)
-                if _digit(x) + _digit(y) + _digit(z) == 6 and z > 0:
-                    results.extend([
-                        (f"{x}/{y}-{z}", 1),
-                    ])
-                x += y
-        return results
-
-    def gen_mul_div(sol):
-        # Case: x*y/z = sol <-> sol*z = x*y
-        results = []
-
-        # Case: xxxx*y/z and xxx*yy/z:
-        if 111 < sol < 49451:
-            for z in range(2,10):
-                results.extend(_find_all_mul_for_sol(int(sol*z), 6, "",
-                                                    f"/{z}", 1))
-
-        # Case: xxx*y/zz or xx*yy/zz
-        if 1 < sol < 981:
-            for z in range(10,100):
-                if (sol*z > 9801):
-                    break
-                results.extend(_find_all_mul_for_sol(int(sol*z), 5, "",
-                                                    f"/{z}", 1))
-
-        # Case: xx*y/zzz <-> sol*zzz = xx*y
-        if 1 <= sol < 9:
-            for y in reversed(range(2,10)):
-                if (y*99 < sol*100):
-                    break
-                for x in reversed(range(10,100)):
-                    xy = int(x*y)
-                    z = int(xy/sol)
-                    if (z < 100):
-                        break
-                    if xy % sol == 0 and _digit(z) == 3:
-                        results.extend([
-                            (f"{x}*{y}/{z}", 2),
-                            (f"{y}*{x}/{z}", 2)
-                        ])
-        return results
-
-    def gen_mul_mul(sol):
-        results = []
-        sol_red = sol
-        factors = []
-        expr = []
-        
-        # Factorize sol
-        max_iter = int(np.floor(np.sqrt(sol_red)))
-        for iter in range(2, max_iter + 1):
-            while sol_red % iter == 0:
-                factors.append(iter)
-                sol_red //= iter
-        if sol_red > 1:  # sol is prime
-            factors.append(sol_red)
-
-        # Generate all partitions using bitmasking
-        len_factors = len(factors)
-        for bitmask in range(1, 2**len_factors):
-            part1_primes = []
-            part2_primes = []
-            part3_primes = []
-            
-            for i in range(len_factors):
-                if bitmask & (1 << i):
-                    part1_primes.append(factors[i])
-                elif bitmask & (1 << i + 1):
-                    part2_primes.append(factors[i])
-                else:
-                    part3_primes.append(factors[i])
-            
-            # Calculate product of each partition
-            a = 1
-            b = 1
-            c = 1            
-            for prime in part1_primes:
-                a *= prime
-            for prime in part2_primes:
-                b *= prime
-            for prime in part3_primes:
-                c *= prime
-            
-            assert a * b * c == sol
-
-            # Check if digits conditions are satisfied
-            if (_digit(a) + _digit(b) + _digit(c) == 6
-                and a != 1 and b != 1 and c != 1
-                and set([a,b,c]) not in expr):                
-                if a == b == c and a != 1:
-                    results.append((f"{a}*{b}*{c}", 1))
-                elif a == b != c:
-                    results.extend([
-                        (f"{c}*{b}*{b}", 3),
-                        (f"{b}*{c}*{b}", 3),
-                        (f"{b}*{b}*{c}", 3),
-                    ])
-                elif a == c != b and a != 1:
-                    results.extend([
-                        (f"{b}*{a}*{a}", 3),
-                        (f"{a}*{b}*{a}", 3),
-                        (f"{a}*{a}*{b}", 3),
-                    ])
-                elif b == c != a and b != 1:
-                    results.extend([
-                        (f"{a}*{b}*{b}", 3),
-                        (f"{b}*{a}*{b}", 3),
-                        (f"{b}*{b}*{a}", 3),
-                    ])
-                    results.append((f"{a}*{b}*{b}", 3))
-                elif a != b != c:
-                    results.extend([
-                        (f"{a}*{b}*{c}", 6),
-                        (f"{a}*{c}*{b}", 6),
-                        (f"{b}*{a}*{c}", 6),
-                        (f"{b}*{c}*{a}", 6),
-                        (f"{c}*{a}*{b}", 6),
-                        (f"{c}*{b}*{a}", 6),
-                        ])
-            expr.append(set([a,b,c]))
-        return results
-        
-    def gen_div_div(sol):
-        # Case: xxxx / y / z <--> z*y*sol = xxxx
-        results = []
-        if 1 <= sol < 2500:
-            for z in range(2,10):
-                for y in range(z,10):
-                    x = int(z*y*sol)
-                    if x > 9999:
-                        break
-                    if x >= 1000:
-                        if z != y:
-                            results.extend([
-                                (f"{x}/{y}/{z}", 2),
-                                (f"{x}/{z}/{y}", 2)
-                            ])
-                        else:
-                            results.append((f"{x}/{y}/{z}", 1))
-        
-        # Case: xxx / yy / z <-> z*yy*sol = xxx
-        if 1 <= sol < 50:
-            for z in range(2,10):
-                if (z*10*sol > 999):
-                    break
-                for y in range(10,100):
-                    x = int(z*y*sol)
-                    if (x > 999):
-                        break
-                    if x >= 100:
-                        results.extend([
-                            (f"{x}/{y}/{z}", 2),
-                            (f"{x}/{z}/{y}", 2),
-                        ])
-        
-        # Case: xx / yy / zz not possible, as yy*zz >= 100
-        
-        return results
-    
-    def concat_results(sol:int,*functions):
-        combined_results = []
-        for func in functions:
-            combined_results.extend(func(sol))
-        return combined_results
-
-    return concat_results(sol, gen_plus_plus,gen_plus_min,gen_min_min,
-                          gen_plus_mul,gen_div_plus, gen_min_mul,
-                          gen_div_min,gen_mul_mul,gen_div_div,gen_mul_div)
-    
-# ---------------------------------------------------------------------------- #
-import ast
-import operator
-        
-def _gen_three_oper(sol): # Maybe use a database for this one? eh
-    # a oper b oper c oper d = sol
-    results = []
+# ----- Subexpression index -----
+
+# Every valid subexpression of up to _INDEX_LEN symbols is enumerated once
+# per process and indexed by (length, kind, operators, bracket pairs), each
+# group sorted by its exact value. An expression of a given length and value
+# is found by splitting it at its last operator of lowest precedence:
+#   sum    = any expression  + or -  term        (kind _SUM)
+#   term   = term            * or /  factor      (kind _TERM)
+#   factor = number | "(" sum or term ")"        (kinds _NUMBER, _BRACKET)
+# The shorter side of a split is enumerated from the index and the other
+# side is looked up by the value it needs to have. Sides longer than the
+# index are split again in the same way. So the work is proportional to the
+# shorter sides plus the output, not to the search space. Every expression
+# has exactly one such split, so it is built exactly once. A new family of
+# shapes is just another call of _compose.
+#
+# Expressions are packed like in expression_store: 4 bits per symbol, with
+# the last symbol in the lowest nibble. Values are exact fractions num/den
+# with den > 0. The commutative count of an expression is the size of its
+# group of rearrangements. skey hashes the multiset of its signed terms,
+# and every term is hashed (tkey) as the multiset of its factors (fkey).
+# Rearranged expressions therefore share their skey.
+
+_INDEX_LEN = 5
+
+_NUMBER, _BRACKET, _TERM, _SUM = 0, 1, 2, 3
+_FACTOR_KINDS = (_NUMBER, _BRACKET)
+_TERM_KINDS = (_NUMBER, _BRACKET, _TERM)
+_ALL_KINDS = (_NUMBER, _BRACKET, _TERM, _SUM)
+
+_DEN_BITS = 20 # all denominators in the index are far below 2**20
+_ANY, _ANY_NONZERO = 0, -1 # target denominators that match every value
+_SYMBOL = {symbol: np.uint64(i)
+           for i, symbol in enumerate(expression_store.SYMBOLS)}
+_COLUMNS = ("code", "num", "den", "skey", "tkey", "fkey")
+_NUMBER_TAG, _BRACKET_TAG, _TIMES_TAG, _DIVIDE_TAG, _PLUS_TAG, _MINUS_TAG = \
+    range(1, 7)
+
+_index_cache = None
+_index_lock = threading.Lock()
+
+def _mix(keys:np.ndarray, tag:int) -> np.ndarray:
+    """splitmix64 of keys ^ tag, the uint64 arithmetic wraps around."""
+
+    x = (keys ^ np.uint64(tag)) + np.uint64(0x9E3779B97F4A7C15)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _empty() -> dict:
+    return {column: np.empty(0, dtype=np.int64 if column in ("num", "den")
+                             else np.uint64) for column in _COLUMNS}
+
+def _take(entries:dict, rows:np.ndarray) -> dict:
+    return {column: entries[column][rows] for column in _COLUMNS}
+
+def _concat(parts:list) -> dict:
+    if not parts:
+        return _empty()
+    return {column: np.concatenate([part[column] for part in parts])
+            for column in _COLUMNS}
+
+def _reduce(num:np.ndarray, den:np.ndarray) -> tuple:
+    """Lowest terms with den > 0, den must not be 0."""
+
+    divisor = np.gcd(num, den) * np.where(den < 0, -1, 1)
+    return num // divisor, den // divisor
+
+def _value_keys(num:np.ndarray, den:np.ndarray) -> np.ndarray:
+    return num * (1 << _DEN_BITS) + den
+
+def _feasible(length:int, n_ops:int, brackets:int) -> bool:
+    # a pair of brackets needs an operator inside, every operator a number
+    return (brackets in (0, 1) and n_ops >= brackets and
+            length >= 2 * n_ops + 1 + 2 * brackets)
+
+def _numbers(values:np.ndarray, length:int) -> dict:
+    """Entries of numbers with `length` digits."""
+
+    values = values.astype(np.int64)
+    code = np.zeros(len(values), dtype=np.uint64)
+    for pos in range(length):
+        digit = values // 10**(length - 1 - pos) % 10
+        code = (code << np.uint64(4)) | digit.astype(np.uint64)
+    fkey = _mix(values.astype(np.uint64), _NUMBER_TAG)
+    tkey = _mix(fkey, _TIMES_TAG)
+    return {"code": code, "num": values, "den": np.ones_like(values),
+            "skey": _mix(tkey, _PLUS_TAG), "tkey": tkey, "fkey": fkey}
+
+def _bracket(inner:dict, length:int) -> dict:
+    """Entries "(" inner ")", the inner expressions have `length` symbols."""
+
+    code = ((_SYMBOL["("] << np.uint64(4 * (length + 1))) |
+            (inner["code"] << np.uint64(4)) | _SYMBOL[")"])
+    fkey = _mix(inner["skey"], _BRACKET_TAG)
+    tkey = _mix(fkey, _TIMES_TAG)
+    return {"code": code, "num": inner["num"], "den": inner["den"],
+            "skey": _mix(tkey, _PLUS_TAG), "tkey": tkey, "fkey": fkey}
+
+def _join(left:dict, right:dict, oper:str, right_len:int,
+          num:np.ndarray = None, den:np.ndarray = None) -> dict:
+    """Entries left oper right, row by row. The value is computed unless
+    it is given."""
+
+    shift = np.uint64(4 * right_len)
+    code = ((left["code"] << (shift + np.uint64(4))) |
+            (_SYMBOL[oper] << shift) | right["code"])
+    if num is None:
+        l_num, l_den, r_num, r_den = (left["num"], left["den"],
+                                      right["num"], right["den"])
+        if oper == "+":
+            num, den = l_num * r_den + r_num * l_den, l_den * r_den
+        elif oper == "-":
+            num, den = l_num * r_den - r_num * l_den, l_den * r_den
+        elif oper == "*":
+            num, den = l_num * r_num, l_den * r_den
+        else:
+            num, den = l_num * r_den, l_den * r_num
+        num, den = _reduce(num, den)
+
+    no_key = np.zeros(len(code), dtype=np.uint64)
+    if oper in "+-":
+        skey = left["skey"] + _mix(right["tkey"], _PLUS_TAG if oper == "+"
+                                   else _MINUS_TAG)
+        tkey = no_key
+    else:
+        tkey = left["tkey"] + _mix(right["fkey"], _TIMES_TAG if oper == "*"
+                                   else _DIVIDE_TAG)
+        skey = _mix(tkey, _PLUS_TAG)
+    return {"code": code, "num": num, "den": den,
+            "skey": skey, "tkey": tkey, "fkey": no_key}
+
+def _operand_kinds(oper:str) -> tuple:
+    """Kinds the (left, right) side of oper may have."""
+
+    if oper in "+-":
+        return _ALL_KINDS, _TERM_KINDS
+    return _TERM_KINDS, _FACTOR_KINDS
+
+def _build_index() -> dict:
+    index = {}
+
+    def groups(length:int, kinds:tuple) -> list:
+        return [(key, entries) for key, entries in index.items()
+                if key[0] == length and key[1] in kinds]
+
+    for length in range(1, _INDEX_LEN + 1):
+        parts = {(_NUMBER, 0, 0): [_numbers(
+            np.arange(10**(length - 1), 10**length), length)]}
+        for (_, _, n_ops, brackets), inner in groups(length - 2,
+                                                     (_TERM, _SUM)):
+            if brackets == 0:
+                parts.setdefault((_BRACKET, n_ops, 1), []).append(
+                    _bracket(inner, length - 2))
+        for oper in "+-*/":
+            kind = _SUM if oper in "+-" else _TERM
+            left_kinds, right_kinds = _operand_kinds(oper)
+            for left_len in range(1, length - 1):
+                right_len = length - 1 - left_len
+                for (_, _, left_ops, left_br), left in groups(left_len,
+                                                              left_kinds):
+                    for (_, _, right_ops, right_br), right in groups(
+                            right_len, right_kinds):
+                        if left_br + right_br > 1:
+                            continue
+                        rows_left, rows_right = np.divmod(
+                            np.arange(len(left["code"]) * len(right["code"])),
+                            len(right["code"]))
+                        if oper == "/": # no division by zero
+                            keep = right["num"][rows_right] != 0
+                            rows_left = rows_left[keep]
+                            rows_right = rows_right[keep]
+                        parts.setdefault(
+                            (kind, left_ops + right_ops + 1,
+                             left_br + right_br), []).append(
+                            _join(_take(left, rows_left),
+                                  _take(right, rows_right), oper, right_len))
+
+        for (kind, n_ops, brackets), group in parts.items():
+            group = _concat(group)
+            assert (group["den"] < 1 << _DEN_BITS).all()
+            key = _value_keys(group["num"], group["den"])
+            order = np.argsort(key, kind="stable")
+            group = _take(group, order)
+            group["key"] = key[order]
+            index[(length, kind, n_ops, brackets)] = group
+    return index
+
+def _subexpression_index() -> dict:
+    """(length, kind, n_ops, brackets) -> entries sorted by value key."""
+
+    global _index_cache
+    with _index_lock:
+        if _index_cache is None:
+            _index_cache = _build_index()
+    return _index_cache
+
+def _index_entries(length:int, kinds:tuple, n_ops:int,
+                   brackets:int) -> dict:
+    index = _subexpression_index()
+    return _concat([index[key] for key in
+                    ((length, kind, n_ops, brackets) for kind in kinds)
+                    if key in index])
+
+def _expand(lo:np.ndarray, hi:np.ndarray) -> tuple:
+    """(rows, positions) of every position in [lo[row], hi[row])."""
+
+    counts = np.maximum(hi - lo, 0)
+    rows = np.repeat(np.arange(len(lo)), counts)
+    starts = np.cumsum(counts) - counts
+    positions = np.arange(counts.sum()) + np.repeat(lo - starts, counts)
+    return rows, positions
+
+def _lookup(num:np.ndarray, den:np.ndarray, length:int, kinds:tuple,
+            n_ops:int, brackets:int) -> tuple:
+    index = _subexpression_index()
+    exact = (den > 0) & (den < 1 << _DEN_BITS) & (np.abs(num) < 1 << 40)
+    key = np.where(exact, _value_keys(num, den), 0)
+    found_rows, found = [], []
+    for kind in kinds:
+        group = index.get((length, kind, n_ops, brackets))
+        if group is None:
+            continue
+        n_group = len(group["key"])
+        lo = np.where(exact, np.searchsorted(group["key"], key, "left"), 0)
+        hi = np.where(exact, np.searchsorted(group["key"], key, "right"), 0)
+        # wildcards: every value, or every value but the zeros (key 1)
+        zero_lo, zero_hi = np.searchsorted(group["key"], [1, 2])
+        hi = np.where(den == _ANY, n_group, hi)
+        hi = np.where(den == _ANY_NONZERO, zero_lo, hi)
+        for lo, hi in ((lo, hi),
+                       (np.full(len(den), zero_hi),
+                        np.where(den == _ANY_NONZERO, n_group, zero_hi))):
+            rows, positions = _expand(lo, hi)
+            found_rows.append(rows)
+            found.append(_take(group, positions))
+    if not found:
+        return np.empty(0, dtype=np.int64), _empty()
+    return np.concatenate(found_rows), _concat(found)
+
+def _other_value(oper:str, known_is_left:bool, e_num:np.ndarray,
+                 e_den:np.ndarray, k_num:np.ndarray,
+                 k_den:np.ndarray) -> tuple:
+    """
+    Value the other side of known oper other (or other oper known) needs
+    so that the whole has the value e.
 
-    # all "+-"
-    for a, b, c in itertools.product(list(range(1,10)), repeat=3):
-        for op1, op2, op3 in itertools.product(["+", "-"], repeat=3):
-            d = int((sol-(eval(f"{a}{op1}{b}{op2}{c}")))
-                    * (2 * int(op3 == "+") - 1))
-            if 10 <= d <= 99:
-                how_many_mul = (op1 == "+") + (op2 == "+") + (op3 == "+")
-                n_c = (how_many_mul + 1) * 6
-                results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}", n_c))
-                results.append((f"{a}{op1}{b}{op3}{d}{op2}{c}", n_c))
-                results.append((f"{a}{op3}{d}{op1}{b}{op2}{c}", n_c))
-                if op3 in "+":
-                    results.append((f"{d}{op3}{a}{op1}{b}{op2}{c}", n_c))
-            else:
-                d = (eval(f"{a}{op1}{b}{op2}{c}"))-sol
-
-    # all "*/"
-    for a, b, c in itertools.product(list(range(2,10)), repeat=3):
-        for op1, op2, op3 in itertools.product(["*", "/"], repeat=3):
-            partial_sol = eval(f"{a}{op1}{b}{op2}{c}")
-            if op3 == "*" and partial_sol != 0:
-                d = sol/partial_sol
-            elif op3 == "/" and sol != 0:
-                d = partial_sol/sol
-            else:
-                continue
-            if 10 <= d <= 99 and d.is_integer():  
-                how_many_mul = (op1 == "*") + (op2 == "*") + (op3 == "*")
-                n_c = (how_many_mul + 1) * 6
-                d = int(d)
-                results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}", n_c))
-                results.append((f"{a}{op1}{b}{op3}{d}{op2}{c}", n_c))
-                results.append((f"{a}{op3}{d}{op1}{b}{op2}{c}", n_c))
-                if op3 in "+":
-                    results.append((f"{d}{op3}{a}{op1}{b}{op2}{c}", n_c))
-
-    # op1, op2 in "+-", op3 in "*/"
-    for a, b, c in itertools.product(list(range(1,10)), repeat=3):
-        for op1, op2 in itertools.product(["+", "-"], repeat=2):
-            for op3 in "*/":
-                if c == 1:
-                    continue
-                partial_sol = ((sol - eval(f"{a}{op1}{b}"))
-                                * (2 * int(op2 == "+") - 1))
-                if op3 == "*":
-                    d = sol / c
-                else:
-                    d = c / sol
-                if 10 <= d <= 99 and d.is_integer():
-                    d = int(d)
-                    n_c = (1+ (op3 == "*"))*2*((op1 == "+")+(op2 == "+")+1)
-                    d = int(d)
-                    results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}", n_c))
-                    results.append((f"{a}{op2}{c}{op3}{d}{op1}{b}", n_c))
-                    if op2 == "+":
-                        results.append((f"{c}{op3}{d}{op1}{b}{op2}{a}", n_c))
-                    if op3 == "/":
-                        continue
-                    results.append((f"{a}{op1}{b}{op2}{d}{op3}{c}", n_c))
-                    results.append((f"{a}{op2}{d}{op3}{c}{op1}{b}", n_c))
-                    if op2 == "+":
-                        results.append((f"{d}{op3}{c}{op1}{b}{op2}{a}", n_c))
-
-    # one "*/" in op1 or op2, other and op3 in "+-"
-    for a, b, c in itertools.product(list(range(1,10)), repeat=3):
-        for op1, op3 in itertools.product(["+", "-"], repeat=2):
-            for op2 in "*/":
-                if b == 1 or c == 1:
-                    continue
-                d = ((2 * int(op3 == "+") - 1) * 
-                     (sol - eval(f"{a}{op1}{b}{op2}{c}")))
-                if 10 <= d <= 99 and d.is_integer():
-                    d = int(d)
-                    n_c = (1+(op2 == "*"))*2*((op1 == "+")+(op3== "+")+1)
-
-                    results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}", n_c))
-                    results.append((f"{a}{op3}{d}{op1}{b}{op2}{c}", n_c))
-                    if op1 == "+":
-                        results.append((f"{b}{op2}{c}{op3}{d}{op1}{a}", n_c))
-                    if op3 == "+":
-                        results.append((f"{d}{op1}{a}{op3}{b}{op1}{c}", n_c))
-                    if op2 == "/":
-                        continue                    
-                    results.append((f"{a}{op1}{c}{op2}{b}{op3}{d}", n_c))
-                    results.append((f"{a}{op3}{d}{op1}{c}{op2}{b}", n_c))
-                    if op1 == "+":
-                        results.append((f"{c}{op2}{b}{op3}{d}{op1}{a}", n_c))
-                    if op3 == "+":
-                        results.append((f"{d}{op1}{a}{op3}{c}{op1}{b}", n_c))
-
-    # op1, op2 in "*/", op3 in "+-"
-    for a, b, c in itertools.product(list(range(2,10)), repeat = 3):
-        for op1, op2 in itertools.product(["*", "/"], repeat = 2):
-            for op3 in "+-":
-                d = ((2 * int(op3 == "+") - 1) *
-                        (sol - eval(f"{a}{op1}{b}{op2}{c}")))
-                if 10 <= d <= 99 and d.is_integer():
-                    d = int(d)
-                    n_c = (1+(op3 == "+"))*2*((op1 == "*")+(op3== "*")+1)
-                    results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}", n_c))
-                    if op3 == "+":
-                        results.append((f"{d}{op3}{a}{op1}{b}{op2}{c}", n_c))
-
-    # op1 "*/", op2 in "+-", op3 in "*/"
-    for a, b, c in itertools.product(list(range(2,10)), repeat=3):
-        for op1, op3 in itertools.product(["*", "/"], repeat=2):
-            for op2 in "+-":
-                partial_sol = ((sol - eval(f"{a}{op1}{b}")) *
-                               (2 * (op1 == "+") - 1))
-                if op3 == "*":
-                    d = partial_sol / c
-                elif partial_sol != 0:
-                    d = c / partial_sol
-                else:
-                    continue
-                if 10 <= d <= 99 and d.is_integer():
-                    d = int(d)
-                    n_c = ((op1 == "*")+1)*((op2 == "+")+1)*((op3 == "*")+1)
-                    results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}",n_c))
-                    if op2 == "+":
-                        results.append((f"{c}{op3}{d}{op2}{a}{op1}{b}",n_c))
-                    if op3 == "*":
-                        results.append((f"{a}{op1}{b}{op2}{d}{op3}{c}",n_c))
-                    if op2 == "+" and op3 == "*":
-                        results.append((f"{d}{op3}{c}{op2}{a}{op1}{b}",n_c))
-    # op1 "+-", op2 in "*/", op3 in "*/"
-    for a in range(1,10):
-        for b, c in itertools.product(list(range(2,10)), repeat=2):
-            for op1 in "+-":
-                for op2, op3 in itertools.product(["*", "/"], repeat=2):
-                    partial_sol = (sol - a) * (2 * (op1 == "+") - 1)
-                    bc = eval(f"{b}{op1}{c}")
-                    if op3 == "*" and bc != 0:
-                        d = partial_sol / bc
-                    elif op3 == "/" and partial_sol != 0:
-                        d = bc / partial_sol
-                    else:
-                        continue
-                    if 10 <= d <= 99 and d.is_integer():
-                        d = int(d)
-                        n_c = ((op1 == "+")+1)*((op2 == "*")+(op3 == "*")+1)*2
-                        results.append((f"{a}{op1}{b}{op2}{c}{op3}{d}",n_c))
-                        results.append((f"{a}{op1}{b}{op3}{d}{op2}{c}",n_c))
-                        if op3 == "*":
-                            results.append((f"{a}{op1}{d}{op2}{c}{op3}{b}",n_c))
-                        if op1 == "+":
-                            results.append((f"{b}{op2}{c}{op3}{d}{op1}{a}",n_c))
-                            results.append((f"{b}{op3}{d}{op2}{c}{op1}{a}",n_c))
-                        if op1 == "+" and op3 == "*":
-                            results.append((f"{d}{op2}{c}{op3}{b}{op1}{a}",n_c))
-
-    #return results
-    return list(set((results)))
-# ---------------------------------------------------------------------------- #
+    Returns:
+        tuple: (num, den, ok), den is _ANY or _ANY_NONZERO if every value
+            does, ok is False where no value does.
+    """
 
-def _gen_brackets(sol):
-    # Idea: Generate x oper c first. Then express x = (a oper b) with brackets.
-    def bracket_expr(solx:int, lenx, prefix:str, postfix:str,
-                     multiply_com_num:int = 1):
-        
-        # Case: (aa+b)
-        expr = []
-        if 11 <= solx <= 108 and lenx == 6:
-            for b in range(1,10):
-                a = int(solx - b)
-                if _digit(a) == 2:
-                    expr.extend([
-                        (f"{prefix}({a}+{b}){postfix}",2*multiply_com_num),
-                        (f"{prefix}({b}+{a}){postfix}",2*multiply_com_num)
-                    ])
-        # Case: (a+b)
-        if 2 <= solx <= 18 and lenx == 5:
-            for b in range(1,10):
-                a = int(solx-b)
-                if _digit(a) == 1 and a != b and a > 0:
-                    expr.extend([
-                        (f"{prefix}({a}+{b}){postfix}",2*multiply_com_num)
-                    ])
-                elif a == b:
-                    expr.extend([
-                        (f"{prefix}({a}+{b}){postfix}",1*multiply_com_num)
-                    ])
-        # Case: (aa-b)
-        if 1 <= solx <= 98 and lenx == 6:
-            for b in range(1,10):
-                a = int(solx+b)
-                if 10 <= a <= 99:
-                    expr.append((f"{prefix}({a}-{b}){postfix}",
-                                 1*multiply_com_num))
-        # Case: (a-b)
-        if 1 <= solx <= 8 and lenx == 5:
-            for a in range(2,10):
-                b = int(solx+a)
-                if 0 < b <= 9:
-                    expr.append((f"{prefix}({a}-{b}){postfix}",
-                                 1*multiply_com_num))
-        # Case: (aa*b)
-        if 10 <= solx <= 891 and lenx == 6:
-            for b in range(2,10):
-                a = sol/b
-                if a.is_integer() and 10 <= a <= 99:
-                    expr.extend([
-                        (f"{prefix}({int(a)}*{b}){postfix}",2*multiply_com_num),
-                        (f"{prefix}({b}*{int(a)}){postfix}",2*multiply_com_num)
-                    ])
-        # Case: (a*b)
-        if 4 <= solx <= 81 and lenx == 5:
-            for a in range(2,10):
-                b = sol/a
-                if b.is_integer() and 2 <= b <= 9:
-                    if a != b:
-                        expr.append((f"{prefix}({a}*{int(b)}){postfix}",
-                                    2*multiply_com_num))
-                    else:
-                        expr.append((f"{prefix}({a}*{int(b)}){postfix}",
-                                     1*multiply_com_num))
-        # Case: (aa/b)
-        if 2 <= solx < 50 and lenx == 6:
-            for b in range(2,10):
-                a = int(sol*b)
-                if 10 <= a <= 99:
-                    expr.append((f"{prefix}({a}/{b}){postfix}",
-                                    1*multiply_com_num))
-        # Case: (a/b)
-        match solx:
-            case 1:
-                for i in range(2,10):
-                    expr.append((f"{prefix}({i}/{i}){postfix}",
-                                    1*multiply_com_num))
-            case 2:
-                for i in range(2,5):
-                    expr.append((f"{prefix}({i*2}/{i}){postfix}",
-                                    1*multiply_com_num))
-            case 3:
-                for i in range(2,4):
-                    expr.append((f"{prefix}({i*3}/{i}){postfix}",
-                                    1*multiply_com_num))
-            case 4:
-                    expr.append((f"{prefix}({8}/{4}){postfix}", 
-                                 1*multiply_com_num))
-        return expr
-            
-    def gen_b_plus(sol): # sol = x + c = (a oper b) + c
-        results = []
-        for c in range(1,100):
-            x = sol - c
-            if 1 <= c <= 9:
-                results.extend(bracket_expr(x, 6, f"{c}+", "", 2))
-                results.extend(bracket_expr(x, 6, "", f"+{c}", 2))
-            else:
-                results.extend(bracket_expr(x, 5, f"{c}+", "", 2))
-                results.extend(bracket_expr(x, 5, "", f"+{c}", 2))
-        return results
-    
-    def gen_b_minus(sol):
-        # sol = x - c = (a oper b) - c
-        results = []
-        for c in range(1,100):
-            x = sol + c
-            if 1 <= c <= 9:
-                results.extend(bracket_expr(x, 6, "", f"-{c}", 1))
-            else:
-                results.extend(bracket_expr(x, 5, "", f"-{c}", 1))
-        # sol = c - x = c - (a oper b)
-        for c in range(1,100):
-            x = c - sol
-            if 1 <= c <= 9 and x > 0:
-                results.extend(bracket_expr(x, 6, f"{c}-", "", 1))
-            elif 10 <= c <= 99 and x > 0:
-                results.extend(bracket_expr(x, 5, f"{c}-", "", 1))
-        return results
-
-    def gen_b_mul(sol): # sol = x * c = (a oper b) * c
-        results = []
-        for c in range(2,100):
-            x = sol/c
-            if x.is_integer():
-                if 1 <= c <= 9:
-                    results.extend(bracket_expr(x, 6, f"{c}*", "", 2))
-                    results.extend(bracket_expr(x, 6, "", f"*{c}", 2))
-                else:
-                    results.extend(bracket_expr(x, 5, f"{c}*", "", 2))
-                    results.extend(bracket_expr(x, 5, "", f"*{c}", 2))
-        return results
-
-    def gen_b_div(sol):
-        # sol = x / c = (a oper b) / c
-        results = []
-        for c in range(2,100):
-            x = sol/c
-            if x.is_integer():
-                if 1 <= c <= 9:
-                    results.extend(bracket_expr(x, 6, "", f"/{c}", 2))
-                else:
-                    results.extend(bracket_expr(x, 5, "", f"/{c}", 2))
-        # sol = c / x = c / (a oper b)
-        for c in range(2,100):
-            x = c/sol
-            if x.is_integer():
-                if 1 <= c <= 9:
-                    results.extend(bracket_expr(x, 6, f"{c}/", "", 2))
-                else:
-                    results.extend(bracket_expr(x, 5, f"{c}/", "", 2))
-        return results
-    
-    results = []
-    results.extend(gen_b_plus(sol))
-    results.extend(gen_b_minus(sol))
-    results.extend(gen_b_mul(sol))
-    results.extend(gen_b_div(sol))
-    return gen_b_div(sol)
+    ok = np.ones(len(e_num), dtype=bool)
+    wildcard = np.zeros(len(e_num), dtype=np.int64) + 1 # 1: no wildcard
+    if oper == "+":
+        num, den = e_num * k_den - k_num * e_den, e_den * k_den
+    elif oper == "-" and known_is_left:
+        num, den = k_num * e_den - e_num * k_den, e_den * k_den
+    elif oper == "-":
+        num, den = e_num * k_den + k_num * e_den, e_den * k_den
+    elif oper == "*":
+        # known * other = e, a zero factor makes the other one arbitrary
+        zero = k_num == 0
+        num, den = e_num * k_den, e_den * np.where(zero, 1, k_num)
+        ok &= ~zero | (e_num == 0)
+        wildcard[zero] = _ANY
+    elif known_is_left:
+        # known / other = e, so other = known / e, or anything but 0 if both
+        # are 0; known != 0 = e is impossible
+        zero = e_num == 0
+        num, den = k_num * e_den, k_den * np.where(zero, 1, e_num)
+        ok &= np.where(zero, k_num == 0, k_num != 0)
+        wildcard[zero] = _ANY_NONZERO
+    else:
+        num, den = e_num * k_num, e_den * k_den
+        ok &= k_num != 0
+
+    num, den = _reduce(num, np.where(den == 0, 1, den))
+    num = np.where(wildcard == 1, num, 0)
+    den = np.where(wildcard == 1, den, wildcard)
+    return num, den, ok
+
+def _split(num:np.ndarray, den:np.ndarray, oper:str, left:tuple,
+           right:tuple):
+    """
+    Expressions "left oper right" with the target values num / den, left
+    and right are (length, kinds, n_ops, brackets) of the two sides.
+
+    Returns:
+        tuple: (rows, entries) as _solve, or None.
+    """
+
+    if not (_feasible(*left[:1], *left[2:]) and
+            _feasible(*right[:1], *right[2:])):
+        return None
+    known_is_left = left[0] <= right[0]
+    known_side, other_side = (left, right) if known_is_left else (right, left)
+    known = _index_entries(*known_side)
+    n_known = len(known["code"])
+    if n_known == 0:
+        return None
+
+    rows = np.repeat(np.arange(len(num)), n_known)
+    known_rows = np.tile(np.arange(n_known), len(num))
+    other_num, other_den, ok = _other_value(
+        oper, known_is_left, num[rows], den[rows],
+        known["num"][known_rows], known["den"][known_rows])
+    keep = np.flatnonzero(ok)
+    other_rows, other = _solve(other_num[keep], other_den[keep], *other_side)
+    pairs = keep[other_rows]
+    known = _take(known, known_rows[pairs])
+    left_entries, right_entries = ((known, other) if known_is_left
+                                   else (other, known))
+    rows = rows[pairs]
+    return rows, _join(left_entries, right_entries, oper, right[0],
+                       num[rows], den[rows])
+
+def _solve(num:np.ndarray, den:np.ndarray, length:int, kinds:tuple,
+           n_ops:int, brackets:int) -> tuple:
+    """
+    Finds all subexpressions with the given shape and one of the target
+    values.
+
+    Args:
+        num, den (np.ndarray): Target values num[i] / den[i], den may be
+            _ANY or _ANY_NONZERO.
+        length (int): Symbols of the subexpressions.
+        kinds (tuple): Allowed kinds (_NUMBER, _BRACKET, _TERM, _SUM).
+        n_ops (int): Operators of the subexpressions.
+        brackets (int): Bracket pairs of the subexpressions.
+
+    Returns:
+        tuple: (rows, entries), entry k has the value of target rows[k].
+    """
+
+    if not _feasible(length, n_ops, brackets) or len(num) == 0:
+        return np.empty(0, dtype=np.int64), _empty()
+    if length <= _INDEX_LEN:
+        return _lookup(num, den, length, kinds, n_ops, brackets)
+    if (den <= 0).any():
+        # wildcards only come from a zero factor, which takes at least 3 of
+        # the 8 symbols, so the other side always fits into the index
+        keep = np.flatnonzero(den > 0)
+        rows, found = _solve(num[keep], den[keep], length, kinds, n_ops,
+                             brackets)
+        return keep[rows], found
+
+    parts = []
+    if _NUMBER in kinds and n_ops == 0 and brackets == 0:
+        rows = np.flatnonzero((den == 1) & (num >= 10**(length - 1)) &
+                              (num < 10**length))
+        parts.append((rows, _numbers(num[rows], length)))
+    if _BRACKET in kinds and brackets == 1:
+        rows, inner = _solve(num, den, length - 2, (_TERM, _SUM), n_ops, 0)
+        parts.append((rows, _bracket(inner, length - 2)))
+    for oper in "+-*/":
+        if (_SUM if oper in "+-" else _TERM) not in kinds:
+            continue
+        left_kinds, right_kinds = _operand_kinds(oper)
+        for left_len in range(1, length - 1):
+            for left_ops in range(n_ops):
+                for left_br in range(brackets + 1):
+                    parts.append(_split(
+                        num, den, oper,
+                        (left_len, left_kinds, left_ops, left_br),
+                        (length - 1 - left_len, right_kinds,
+                         n_ops - 1 - left_ops, brackets - left_br)))
+
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return np.empty(0, dtype=np.int64), _empty()
+    return (np.concatenate([rows for rows, _ in parts]),
+            _concat([found for _, found in parts]))
+
+def _compose(sol:int, n_ops:int, brackets:int = 0) -> list:
+    """
+    Generates all valid expressions of the given shape.
+
+    Args:
+        sol (int): The solution the expressions should equal
+        n_ops (int): Operators of the expressions
+        brackets (int, optional): Bracket pairs of the expressions
+
+    Returns: list filled with tuples (expr, n),
+        n = amount of commutative solutions
+    """
+
+    if sol < 0:
+        return []
+    _, found = _solve(np.array([sol], dtype=np.int64),
+                      np.ones(1, dtype=np.int64), expression_store.EXPR_LEN,
+                      (_TERM, _SUM), n_ops, brackets)
+    expressions = expression_store.unpack_expressions(
+        found["code"].astype(np.uint32))
+    skey = found["skey"]
+    if brackets:
+        # brackets are only valid if dropping them changes the value
+        valid = np.array([expression_evaluator.integer_value(expr) is not None
+                          for expr in expressions], dtype=bool)
+        expressions = [expr for expr, ok in zip(expressions, valid) if ok]
+        skey = skey[valid]
+    if not expressions:
+        return []
+    _, group, group_size = np.unique(skey, return_inverse=True,
+                                     return_counts=True)
+    return list(zip(expressions, group_size[group.reshape(-1)].tolist()))
+
+def _gen_two_oper(sol:int) -> list:
+    """Generates math expr with two operators, x op y op z, as tuples
+    (expr, n), n = amount of commutative solutions."""
+
+    return _compose(sol, 2)
+
+def _gen_three_oper(sol:int) -> list:
+    """Generates math expr with three operators, a op b op c op d, as
+    tuples (expr, n), n = amount of commutative solutions."""
+
+    return _compose(sol, 3)
+
+def _gen_brackets(sol:int) -> list:
+    """Generates math expr with one pair of brackets around two of three
+    numbers, e.g. (aa+b)*c or c/(a-b), as tuples (expr, n), n = amount of
+    commutative solutions."""
+
+    return _compose(sol, 2, brackets=1)
 
 # ---------------------------------------------------------------------------- #
 
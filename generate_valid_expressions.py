@@ -1,36 +1,103 @@
-import warnings
+import argparse
 import time
 import math
+import itertools
 import multiprocessing
+import signal
 from typing import Iterable
 
 import sqlite3
 
+import numpy as np
+
+import build_metrics # type: ignore
+import expression_evaluator # type: ignore
+import expression_store # type: ignore
 
 
 # ----- Generate all valid expressions -----
 
-# Runtime: 30min-40min
+# Runtime: 30min-40min on a single core for the enumeration, it is split into
+# many small work units that run on all cores. The rows are streamed over a
+# queue to a single writer process, the only one touching the database.
+
+DB_PATH = 'valid_guesses.db'
+QUEUE_BATCH_SIZE = 50_000 # rows per queue message
+COMMIT_SIZE = 1_000_000 # rows per write transaction
+COMMIT_INTERVAL = 30 # seconds, bounds the work lost on a crash
 
 def get_connection():
     """Establishes a connection to the SQLite database."""
 
-    return sqlite3.connect('valid_guesses.db')
+    return sqlite3.connect(DB_PATH)
+
+def create_table(conn) -> None:
+    """Creates the valid_guesses table, clustered on the solution value.
+
+    The table is a WITHOUT ROWID table whose primary key is
+    (integer, string), so the rows are stored in a B-tree ordered by value.
+    Looking up all expressions for one solution is a range read over
+    neighbouring pages and the key covers the whole query, no table lookup
+    is needed.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+
+    conn.execute("CREATE TABLE IF NOT EXISTS valid_guesses " +
+                 "(integer INTEGER NOT NULL, string TEXT NOT NULL, " +
+                 "PRIMARY KEY (integer, string)) WITHOUT ROWID")
+    conn.commit()
+
+def create_manifest_table(conn) -> None:
+    """Creates the build_manifest table, one row per finished work unit.
+
+    A unit is recorded in the same transaction as its last rows, so after a
+    crash or Ctrl-C every unit in the manifest is complete in valid_guesses.
+    Interrupted units are simply run again, the primary key of valid_guesses
+    together with INSERT OR IGNORE makes that idempotent.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+
+    conn.execute("CREATE TABLE IF NOT EXISTS build_manifest " +
+                 "(unit TEXT PRIMARY KEY, n_valid INTEGER NOT NULL, " +
+                 "finished REAL NOT NULL)")
+    conn.commit()
+
+def finished_units(conn) -> set:
+    """Keys of all work units recorded in the manifest."""
+
+    return {row[0] for row in conn.execute("SELECT unit FROM build_manifest")}
+
+def finalize_database(conn) -> None:
+    """Rewrites the database file so the pages are physically in key order.
 
-def add_expr(data):
-    """Adds data to the sqlite database
+    Rows arrive in whatever order the generators produce them, which leaves
+    the clustered B-tree fragmented. VACUUM rebuilds it sequentially and
+    ANALYZE refreshes the planner statistics.
 
     Args:
+        conn (sqlite3.Connection): Connection to the database.
+    """
+
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.execute("ANALYZE")
+    conn.commit()
+
+def add_expr(c, data):
+    """Adds data to the sqlite database, the caller commits.
+
+    Args:
+        c (sqlite3.Cursor): Cursor of the writer connection.
         data (list of tuples): A list where each tuple contains:
             - integer (int): evaluation of the math. expression
             - string (str): math. expression as strings
     """
-    conn = get_connection()
-    c = conn.cursor()
-    c.executemany("INSERT INTO valid_guesses "+
+    c.executemany("INSERT OR IGNORE INTO valid_guesses "+
                   "(integer, string) VALUES (?, ?)", data)
-    conn.commit()
-    conn.close()
 
 def valid_pos_for_closing_bracket(expr) -> bool:
     """Determines if there is an operator within the brackets.
@@ -57,31 +124,23 @@ def valid_pos_for_closing_bracket(expr) -> bool:
             return False
     return True
 
-def is_valid_formula(expr, tolerance=1e-8):
+def is_valid_formula(expr):
     """
     Checks if the given expression is a valid formula.
 
-    This function evaluates an expression to determine if it is valid, i.e.
-    does not contain divisions by zero.
-    Furthermore the result of the (mathematical) expression shall be an integer.
+    The expression must not divide by zero, has to evaluate exactly to a
+    non-negative integer and may not contain superfluous brackets. See
+    expression_evaluator.integer_value, the generators call that directly
+    to get the value from the same evaluation.
 
     Args:
         expr (str): The expression to evaluate.
-        tolerance (float, optional): The tolerance level for checking if the
-        result is an integer. Defaults to 1e-8.
 
     Returns:
-        bool: True if the expression is valid and evaluates to a non-negative
-        integer within the specified tolerance, False otherwise.
+        bool: True if the expression is valid, False otherwise.
     """
 
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        try:
-            result = eval(expr) #filter remaining div by 0 and similar errors
-            return result >= 0 and abs(result - round(result)) < tolerance
-        except Exception:
-            return False
+    return expression_evaluator.integer_value(expr) is not None
 
 def count_digits(n):
     """Counts the number of digits in an integer.
@@ -98,142 +157,220 @@ def count_digits(n):
     else:
         return math.floor(math.log10(abs(n))) + 1
     
-def print_progress(start_time, operations,
-                   iteration:int, total_iterations:int) -> None:
-    """Prints the Progress"""
+def _evaluate_chain(operands:list, opers:tuple) -> tuple:
+    """Exact, vectorized evaluation of n0 op1 n1 op2 n2 ... for fixed opers.
 
-    if iteration % round(total_iterations / 100) == 0:
-        percent = "{:.0%}".format(iteration / total_iterations)
-        elapsed_time = round(time.time() - start_time)
-        print(f"[----- Simple expressions {operations} ----- " +
-                f"Current Progress: {percent} ----- " +
-                f"Elapsed Time: {elapsed_time} seconds -----]")
+    Same arithmetic as expression_evaluator: numerator/denominator pairs,
+    * and / bind to the product currently being built, + and - close it.
 
-def generate_expr_w_one_oper(start_time=time.time(), operations = "+-") -> None:
-    # split this in "+-" and "*/" for better multiprocessing
+    Args:
+        operands (list): ints or equally long int64 arrays, one per number.
+        opers (tuple of str): The operators between the numbers.
 
+    Returns:
+        tuple: (num, den, ok) arrays, ok is False where we divide by 0.
     """
-    Generates mathematical expressions with one operator of the form x oper y.
+
+    num = np.int64(0) # sum of the finished products
+    den = np.int64(1)
+    t_num = np.asarray(operands[0], dtype=np.int64) # current product
+    t_den = np.ones_like(t_num)
+    ok = np.ones(np.broadcast(*operands).shape, dtype=bool)
+    sign = 1
+
+    for oper, factor in zip(opers, operands[1:]):
+        factor = np.asarray(factor, dtype=np.int64)
+        if oper == "*":
+            t_num = t_num * factor
+        elif oper == "/":
+            ok &= factor != 0
+            t_den = t_den * np.where(factor != 0, factor, 1)
+        else:
+            num = num * t_den + sign * t_num * den
+            den = den * t_den
+            t_num, t_den = factor, np.ones_like(factor)
+            sign = 1 if oper == "+" else -1
+    return num * t_den + sign * t_num * den, den * t_den, ok
+
+def _emit_valid(template:str, operands:list, opers:tuple,
+                stats:dict = None) -> Iterable:
+    """Evaluates a whole block, formats only the valid expressions.
 
     Args:
-        start_time (float, optional): The start time for measuring the elapsed
-            time. Used to track progress.
-        operations (str, optional): The operators to use in the expressions.
-            Defaults to "+-". --> run twice, once with "+-", once with "*/"
+        template (str): Format string with one {} per array operand, the
+            scalar operands are already written into it.
+        operands (list): int64 arrays (or ints), one per number.
+        opers (tuple of str): The operators between the numbers.
+        stats (dict, optional): stats["candidates"] is increased by the
+            number of evaluated expressions.
+
+    Yields:
+        tuple: (integer, string) for every valid expression.
     """
 
-    conn = get_connection()
-    c = conn.cursor()
-    batch = []
-    iter = 0
-    total_iter = 24_300_000*len(operations)
-    batch_size = 1_000_000
-
-    def add_full_batches(num1:int, num2:int, oper:str, iter:int) -> int:
-        expr1 = f"{num1}{oper}{num2}"
-        expr2 = f"{num2}{oper}{num1}"
-        iter += 1
-        print_progress(start_time, operations, iter, total_iter)
-        if is_valid_formula(expr1):
-            batch.append((round(eval(expr1)), expr1))
-        if is_valid_formula(expr2):
-            batch.append((round(eval(expr2)), expr2))
-        if len(batch) >= batch_size:
-            add_expr(batch)
-            batch.clear()
-        return iter
-
-    for num1 in range(1,1000):
-        num2_len = 7-count_digits(num1)
-        for num2 in range(10**(num2_len-1), 10**num2_len):
-            for oper in operations:
-                iter = add_full_batches(num1, num2, oper, iter)
-                        
-    if len(batch) > 0:
-        add_expr(batch)
+    num, den, ok = _evaluate_chain(operands, opers)
+    # den > 0 always, all numbers are positive
+    valid = ok & (num % den == 0) & (num >= 0)
+    if stats is not None:
+        stats["candidates"] += valid.size
+    if not valid.any():
+        return
+    num = np.broadcast_to(num, valid.shape)[valid]
+    den = np.broadcast_to(den, valid.shape)[valid]
+    values = (num // den).tolist()
+    columns = [operand[valid].tolist() for operand in operands
+               if np.ndim(operand) > 0]
+    for value, numbers in zip(values, zip(*columns)):
+        yield value, template.format(*numbers)
+
+def _digit_compositions(n_digits:int, n_numbers:int) -> Iterable:
+    """All ways to split n_digits among n_numbers numbers (each >= 1)."""
+
+    for lengths in itertools.product(range(1, n_digits + 1),
+                                     repeat=n_numbers):
+        if sum(lengths) == n_digits:
+            yield lengths
+
+def _operand_grid(lengths:tuple, num2_start:int = 1,
+                  num2_stop:int = None) -> list:
+    """Flat arrays of all numbers with the given digit lengths.
+
+    The first array can be restricted to [num2_start, num2_stop), this is
+    how the two operator work units cut y into blocks.
+    """
 
-    conn.close()
+    ranges = [np.arange(10 ** (length - 1), 10 ** length, dtype=np.int64)
+              for length in lengths]
+    if num2_stop is not None:
+        ranges[0] = ranges[0][(ranges[0] >= num2_start) &
+                              (ranges[0] < num2_stop)]
+    grid = np.meshgrid(*ranges, indexing="ij")
+    return [axis.ravel() for axis in grid]
 
-    print(f"Generating expressions with {operations} is done.")
+def _generate_vectorized(num1:int, n_opers:int, num2_start:int = 1,
+                         num2_stop:int = None, stats:dict = None) -> Iterable:
+    """Vectorized enumeration of num1 op n2 op ... with n_opers operators.
 
-def generate_expr_w_two_opers(start_time=time.time()) -> None:
+    For every split of the remaining digits the numbers form a dense grid,
+    which is evaluated for each operator combination as one block.
     """
-    Generates simple mathematical expressions with two operators.
-        They are of the form: x oper y oper z
 
-    Args:
-        start_time (float, optional): The start time for measuring the elapsed
-            time.
+    n_digits = 8 - n_opers - count_digits(num1)
+    for lengths in _digit_compositions(n_digits, n_opers):
+        operands = [num1] + _operand_grid(lengths, num2_start, num2_stop)
+        if operands[1].size == 0:
+            continue
+        for opers in itertools.product("+-*/", repeat=n_opers):
+            template = f"{num1}" + "".join(f"{oper}{{}}" for oper in opers)
+            yield from _emit_valid(template, operands, opers, stats)
+
+def generate_expr_w_one_oper(num1:int, operations = "+-",
+                             vectorized:bool = True,
+                             stats:dict = None) -> Iterable:
     """
-    conn = get_connection()
-    c = conn.cursor()
-    batch = []
-    iter = 0
-    total_iter = 116_640_000
-    batch_size = 1_000_000
-    operators = "+-*/"
+    Generates mathematical expressions with one operator of the form x oper y.
 
-    def generate_num1():
-        for num1 in range(1, 10000):
-            yield num1, 6 - count_digits(num1)
+    One work unit covers a single left number and its mirrored expressions.
 
-    def generate_num2(num_left):
-        for num2 in range(1, 10 ** (num_left - 1)):
-            yield num2, num_left - count_digits(num2)
+    Args:
+        num1 (int): The number in front of the operator, 1 to 999.
+        operations (str, optional): The operators to use in the expressions.
+            Defaults to "+-". --> run twice, once with "+-", once with "*/"
+        vectorized (bool, optional): Evaluate all y at once with NumPy
+            instead of one expression at a time.
+        stats (dict, optional): stats["candidates"] counts every
+            expression that is evaluated.
 
-    def generate_num3(num_left2):
-        for num3 in range(max(1, 10 ** (num_left2 - 1)), 10 ** num_left2):
-            yield num3
-
-    def generate_all_numbers():
-        for num1, num_left in generate_num1():
-            for num2, num_left2 in generate_num2(num_left):
-                for num3 in generate_num3(num_left2):
-                    yield num1, num2, num3
-
-    def gen_expr(num1:int, num2:int, num3:int) -> Iterable:
-        for oper1 in operators:
-            for oper2 in operators:
-                yield f"{num1}{oper1}{num2}{oper2}{num3}"
-
-    for num1, num2, num3 in generate_all_numbers():
-        for expr in gen_expr(num1, num2, num3):
-            iter += 1
-            print_progress(start_time, "2o", iter, total_iter)
-            if is_valid_formula(expr):
-                batch.append((round(eval(expr)), expr))
-                if len(batch) >= batch_size:
-                    add_expr(batch)
-                    batch.clear()
-                
-    if len(batch) > 0:
-        add_expr(batch)
+    Yields:
+        tuple: (integer, string) for every valid expression.
+    """
 
-    print(f"Generating expressions with two operators is done.")
+    num2_len = 7-count_digits(num1)
+    if vectorized:
+        num2 = _operand_grid((num2_len,))[0]
+        for oper in operations:
+            yield from _emit_valid(f"{num1}{oper}{{}}", [num1, num2], (oper,),
+                                   stats)
+            yield from _emit_valid(f"{{}}{oper}{num1}", [num2, num1], (oper,),
+                                   stats)
+        return
+
+    stats = {"candidates": 0} if stats is None else stats
+    for num2 in range(10**(num2_len-1), 10**num2_len):
+        for oper in operations:
+            for expr in (f"{num1}{oper}{num2}", f"{num2}{oper}{num1}"):
+                stats["candidates"] += 1
+                value = expression_evaluator.integer_value(expr)
+                if value is not None:
+                    yield value, expr
+
+def generate_expr_w_two_opers(num1:int, num2_start:int, num2_stop:int,
+                              vectorized:bool = True,
+                              stats:dict = None) -> Iterable:
+    """
+    Generates simple mathematical expressions with two operators.
+        They are of the form: x oper y oper z
 
-    conn.close()
+    One work unit covers a single x and a block of y.
 
-def generate_expr_w_three_opers(start_time = time.time()) -> None:
+    Args:
+        num1 (int): x, 1 to 9999.
+        num2_start (int): first y of the block.
+        num2_stop (int): y stops before this value.
+        vectorized (bool, optional): Evaluate the whole block at once with
+            NumPy instead of one expression at a time.
+        stats (dict, optional): stats["candidates"] counts every
+            expression that is evaluated.
+
+    Yields:
+        tuple: (integer, string) for every valid expression.
     """
-    Generates simple mathematical expressions with two operators.
+    if vectorized:
+        yield from _generate_vectorized(num1, 2, num2_start, num2_stop,
+                                        stats)
+        return
+
+    stats = {"candidates": 0} if stats is None else stats
+    operators = "+-*/"
+    num_left = 6 - count_digits(num1)
+
+    for num2 in range(num2_start, num2_stop):
+        num_left2 = num_left - count_digits(num2)
+        for num3 in range(max(1, 10 ** (num_left2 - 1)), 10 ** num_left2):
+            for oper1 in operators:
+                for oper2 in operators:
+                    expr = f"{num1}{oper1}{num2}{oper2}{num3}"
+                    stats["candidates"] += 1
+                    value = expression_evaluator.integer_value(expr)
+                    if value is not None:
+                        yield value, expr
+
+def generate_expr_w_three_opers(num1:int, vectorized:bool = True,
+                                stats:dict = None) -> Iterable:
+    """
+    Generates simple mathematical expressions with three operators.
         They are of the form: a oper b oper c oper d
 
+    One work unit covers a single a.
+
     Args:
-        start_time (float, optional): The start time for measuring the elapsed
-            time.
+        num1 (int): a, 1 to 99.
+        vectorized (bool, optional): Evaluate all (b, c, d) at once with
+            NumPy instead of one expression at a time.
+        stats (dict, optional): stats["candidates"] counts every
+            expression that is evaluated.
+
+    Yields:
+        tuple: (integer, string) for every valid expression.
     """
 
-    conn = get_connection()
-    c = conn.cursor()
-    batch = []
-    iter = 0
-    total_iter = 16_796_160
-    batch_size = 1_000_000
-    operators = "+-*/"
+    if vectorized:
+        yield from _generate_vectorized(num1, 3, stats=stats)
+        return
 
-    def generate_num1():
-        for num1 in range(1, 100):
-            yield num1, 5 - count_digits(num1)
+    stats = {"candidates": 0} if stats is None else stats
+    operators = "+-*/"
+    num_left = 5 - count_digits(num1)
 
     def generate_num2(num_left):
         for num2 in range(1, 10 ** (num_left - 2)):
@@ -246,62 +383,40 @@ def generate_expr_w_three_opers(start_time = time.time()) -> None:
     def generate_num4(num_left3):
         for num4 in range(max(1, 10 ** (num_left3 - 1)), 10 ** num_left3):
             yield num4
-        
-    def generate_all_numbers():
-        for num1, num_left in generate_num1():
-            for num2, num_left2 in generate_num2(num_left):
-                for num3, num_left3 in generate_num3(num_left2):
-                    for num4 in generate_num4(num_left3):
-                        yield num1, num2, num3, num4
-    
-    def gen_expr(num1:int, num2:int, num3:int, num4:int) -> Iterable:
-        for oper1 in operators:
-            for oper2 in operators:
-                for oper3 in operators:
-                    yield f"{num1}{oper1}{num2}{oper2}{num3}{oper3}{num4}"
-
-    for num1, num2, num3, num4 in generate_all_numbers():
-        for expr in gen_expr(num1, num2, num3, num4):
-            iter += 1
-            print_progress(start_time, "3o", iter, total_iter)
-            if is_valid_formula(expr):
-                batch.append((round(eval(expr)), expr))
-                if len(batch) >= batch_size:
-                    add_expr(batch)
-                    batch.clear()
-                            
-    if len(batch) > 0:
-        add_expr(batch)
-
-    print(f"Generating expressions with three operators is done.")
-    conn.close()
 
-def generate_bracket_expressions(starting_expr="", iter=0,
-                                 start_time=time.time()):
+    for num2, num_left2 in generate_num2(num_left):
+        for num3, num_left3 in generate_num3(num_left2):
+            for num4 in generate_num4(num_left3):
+                for oper1 in operators:
+                    for oper2 in operators:
+                        for oper3 in operators:
+                            expr = (f"{num1}{oper1}{num2}{oper2}" +
+                                    f"{num3}{oper3}{num4}")
+                            stats["candidates"] += 1
+                            value = expression_evaluator.integer_value(expr)
+                            if value is not None:
+                                yield value, expr
+
+def generate_bracket_expressions(starting_expr="(",
+                                 stats:dict = None) -> Iterable:
     """
     Generates the mathematical expressions with brackets.
 
     Args:
-        starting_expr (str, optional): The starting expression for generating 
-            bracket expressions.
-        iter (int, optional): The initial iteration count.
-        start_time (float, optional): The start time for measuring elapsed time. 
-    """
-
-    if start_time is None:
-        start_time = time.time()
+        starting_expr (str, optional): The starting expression for generating
+            bracket expressions. A work unit is "(" plus the first number.
+        stats (dict, optional): stats["candidates"] counts every
+            expression that is evaluated.
 
-    conn = get_connection()
-    c = conn.cursor()
-    batch = []    
+    Yields:
+        tuple: (integer, string) for every valid expression.
+    """
 
+    stats = {"candidates": 0} if stats is None else stats
     full_digit = [str(num) for num in range(1,100)]
     single_digit = [str(num) for num in range(1,10)]
     double_digit = [str(num) for num in range(10,100)]
 
-    total_iterations = 7_000_000
-    iter = 0
-
     def is_int(expr):
         """
         Checks whether expression consists of only integer values.
@@ -337,53 +452,6 @@ def generate_bracket_expressions(starting_expr="", iter=0,
         else:
             return expr[6:] + expr[5] + "(" + expr[::-1][4:7] + ")"
 
-    def print_progress(start_time, iteration:int, total_iterations:int) -> None:
-        """
-        Prints the progress of the expression generation.
-
-        Args:
-            start_time (float): The start time for measuring the elapsed time.
-            iteration (int): The current iteration count.
-            total_iterations (int): The total number of iterations.
-        """
-
-        if iteration % round(total_iterations / 100) == 0:
-            percent = "{:.0%}".format(iteration / total_iterations)
-            elapsed_time = round(time.time() - start_time)
-            print(f"[----- Bracket expressions B ----- "
-                    f"Current Progress: {percent} ----- "
-                    f"Elapsed Time: {elapsed_time} seconds -----]")
-
-    def is_valid_formula(expr, tolerance=1e-8):        
-        """
-        Checks if the given expression is a valid formula.
-
-        Three checks:
-            - is the expression mathematically valid or do we divide by 0.
-            - is the result of the evaluation an integer
-            - are the superfluous (which we do not believe happens in mathler) 
-
-        Args:
-            expr (str): The expression to evaluate.
-            tolerance (float, optional): The tolerance level for checking if the
-            result is an integer. Defaults to 1e-8.
-
-        Returns:
-            bool: True if the expression is valid and evaluates to a
-            non-negative int within the specified tolerance, False otherwise.
-        """
-
-        with warnings.catch_warnings():
-            warnings.simplefilter("ignore")
-            try:
-                result = eval(expr) #filter remaining div by 0 and similar errors
-                is_pos = result >= 0 
-                is_int = abs(result - round(result)) < tolerance
-                equation_no_brackets = expr.replace('(', '').replace(')', '')
-                superfluous_brackets = eval(equation_no_brackets) == eval(expr)
-                return is_pos and is_int and superfluous_brackets
-            except Exception:
-                return False
     def handle_complete_expression(current_expr):
         """
         Handles a complete expression and its mirrored version.
@@ -391,21 +459,13 @@ def generate_bracket_expressions(starting_expr="", iter=0,
         Args:
             current_expr (str): The current complete expression.
         """
-        nonlocal iter, batch
-
-        def handle_expression(expr):
-            nonlocal iter
-            iter += 1
-            print_progress(start_time, iter, total_iterations)
-            if is_valid_formula(expr):
-                batch.append((round(eval(expr)), expr))
-                if len(batch) >= 10000:
-                    add_expr(batch)
-                    batch.clear()
-
-        handle_expression(current_expr)
-        mirror_expr = mirror_expression(current_expr)
-        handle_expression(mirror_expr)
+
+        for expr in (current_expr, mirror_expression(current_expr)):
+            stats["candidates"] += 1
+            # integer_value also rejects superfluous brackets
+            value = expression_evaluator.integer_value(expr)
+            if value is not None:
+                yield value, expr
 
     def recurse_left(current_expr):
         """
@@ -414,14 +474,9 @@ def generate_bracket_expressions(starting_expr="", iter=0,
         Args:
             current_expr (str): The current partial expression.
         """
-        nonlocal iter, batch
-
-        def add_next_chars(next_chars):
-            for char in next_chars:
-                recurse_left(current_expr + char)
 
         if len(current_expr) == 8:
-            handle_complete_expression(current_expr)
+            yield from handle_complete_expression(current_expr)
             return
         
         if len(current_expr) == 0:
@@ -438,42 +493,219 @@ def generate_bracket_expressions(starting_expr="", iter=0,
                 7: single_digit if current_expr[-1] in "+-*/" else []
             }
             next_chars = next_chars_dict.get(len(current_expr), [])
-        add_next_chars(next_chars)
+        for char in next_chars:
+            yield from recurse_left(current_expr + char)
+
+    yield from recurse_left(starting_expr)
+
+# ----- Work units and the writer pipeline -----
 
-    recurse_left(starting_expr)
+GENERATORS = {
+    "one": generate_expr_w_one_oper,
+    "two": generate_expr_w_two_opers,
+    "three": generate_expr_w_three_opers,
+    "bracket": generate_bracket_expressions,
+}
 
+def work_units(num2_block:int = 100) -> list:
+    """Splits the whole enumeration into small, independent work units.
+
+    A unit is a tuple (generator name, *arguments). The two operator case
+    is cut into blocks of its second number as well, a single digit x
+    alone would otherwise be a unit of millions of expressions.
+
+    Args:
+        num2_block (int): Size of the blocks of y for x oper y oper z.
+
+    Returns:
+        list: All work units, the expensive ones first.
+    """
+
+    units = []
+    for num1 in range(1, 10000):
+        num2_stop = 10 ** (5 - count_digits(num1))
+        for num2_start in range(1, num2_stop, num2_block):
+            units.append(("two", num1, num2_start,
+                          min(num2_start + num2_block, num2_stop)))
+    for operations in ("+-", "*/"):
+        for num1 in range(1, 1000):
+            units.append(("one", num1, operations))
+    for num1 in range(1, 100):
+        units.append(("three", num1))
+    for num1 in range(1, 100):
+        units.append(("bracket", f"({num1}"))
+    return units
+
+def unit_key(unit:tuple) -> str:
+    """Stable name of a work unit, e.g. 'two:12:101:201'."""
+
+    return ":".join(str(arg) for arg in unit)
+
+_write_queue = None
+
+def _init_worker(write_queue) -> None:
+    global _write_queue
+    _write_queue = write_queue
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # see main
+
+def run_work_unit(unit:tuple) -> tuple[tuple, int, int, float]:
+    """Enumerates one work unit and streams its rows to the writer.
+
+    The rows are followed by a "done" message for the manifest. Messages of
+    one worker arrive in order, so the writer has seen all rows of a unit
+    before it records the unit as finished.
+
+    Returns:
+        tuple: (unit, number of valid expressions, number of evaluated
+            candidates, seconds spent on the unit)
+    """
+
+    start_time = time.perf_counter()
+    name, *args = unit
+    stats = {"candidates": 0}
+    batch = []
+    n_valid = 0
+    for row in GENERATORS[name](*args, stats=stats):
+        batch.append(row)
+        if len(batch) >= QUEUE_BATCH_SIZE:
+            _write_queue.put(("rows", batch))
+            n_valid += len(batch)
+            batch = []
     if len(batch) > 0:
-        add_expr(batch)
+        _write_queue.put(("rows", batch))
+        n_valid += len(batch)
+    _write_queue.put(("done", unit_key(unit), n_valid))
+    return (unit, n_valid, stats["candidates"],
+            time.perf_counter() - start_time)
+
+def database_writer(write_queue, db_path:str = DB_PATH,
+                    metrics_path:str = build_metrics.METRICS_PATH) -> None:
+    """Single writer: drains the queue into the database.
+
+    Rows are inserted with executemany inside large transactions, which
+    are committed after COMMIT_SIZE rows or COMMIT_INTERVAL seconds. The
+    writer stops at the sentinel None. Every executemany and commit is
+    recorded as an "insert"/"commit" event in metrics_path.
+    """
 
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # see main
+    metrics = build_metrics.BuildMetrics(metrics_path, verbose=False)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    c = conn.cursor()
+    uncommitted = 0
+    last_commit = time.time()
+
+    while True:
+        message = write_queue.get()
+        if message is None:
+            break
+        if message[0] == "rows":
+            insert_start = time.perf_counter()
+            add_expr(c, message[1])
+            metrics.inserted(len(message[1]),
+                             time.perf_counter() - insert_start)
+            uncommitted += len(message[1])
+        else:
+            _, key, n_valid = message
+            c.execute("INSERT OR REPLACE INTO build_manifest " +
+                      "(unit, n_valid, finished) VALUES (?, ?, ?)",
+                      (key, n_valid, time.time()))
+        if (uncommitted >= COMMIT_SIZE or
+                time.time() - last_commit >= COMMIT_INTERVAL):
+            commit_start = time.perf_counter()
+            conn.commit()
+            metrics.committed(uncommitted, time.perf_counter() - commit_start)
+            uncommitted = 0
+            last_commit = time.time()
+
+    commit_start = time.perf_counter()
+    conn.commit()
+    metrics.committed(uncommitted, time.perf_counter() - commit_start)
+    conn.execute("PRAGMA journal_mode = DELETE")
     conn.close()
 
-    print(f"Generating bracket expressions is done.")
-
-    
-def main():
+def main(processes:int = None,
+         metrics_path:str = build_metrics.METRICS_PATH, callback = None):
     """
-    Generates various types of mathematical expressions using multiprocessing.
+    Generates all valid expressions, the work units are spread over a pool of
+    processes and a single writer process inserts the results.
+
+    Units already in the build manifest are skipped, so an interrupted build
+    continues where it stopped.
+
+    Args:
+        processes (int, optional): Number of enumerating processes, defaults
+            to the number of cores.
+        metrics_path (str, optional): JSON lines file for the build metrics,
+            None disables it.
+        callback (callable, optional): Called with every metrics record of
+            the main process (start, unit and finish events).
     """
 
-    start_time = time.time()
-    pool = multiprocessing.Pool()
-    tasks = [
-        pool.apply_async(generate_expr_w_one_oper, (start_time, "+-")),
-        pool.apply_async(generate_expr_w_one_oper, (start_time, "*/")),
-        pool.apply_async(generate_expr_w_two_opers, (start_time,)),
-        pool.apply_async(generate_expr_w_three_opers, (start_time,)),
-        pool.apply_async(generate_bracket_expressions, )
-    ]
-    for task in tasks:
-        task.get()
+    conn = get_connection()
+    done = finished_units(conn)
+    conn.close()
+    units = [unit for unit in work_units() if unit_key(unit) not in done]
+    if len(done) > 0:
+        print(f"resuming build: {len(done)} work units already done, " +
+              f"{len(units)} left")
+    if len(units) == 0:
+        return
+
+    # preemption usually arrives as SIGTERM, treat it like Ctrl-C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    write_queue = multiprocessing.Queue(maxsize=256)
+
+    writer = multiprocessing.Process(target=database_writer,
+                                     args=(write_queue, DB_PATH, metrics_path))
+    writer.start()
+
+    metrics = build_metrics.BuildMetrics(metrics_path, callback,
+                                         units_total=len(units))
+    metrics.start()
+    pool = multiprocessing.Pool(processes, initializer=_init_worker,
+                                initargs=(write_queue,))
+    try:
+        for unit, n_valid, candidates, seconds in pool.imap_unordered(
+                run_work_unit, units):
+            metrics.unit_finished(unit_key(unit), candidates, n_valid,
+                                  seconds)
+    except KeyboardInterrupt:
+        # the open transaction is rolled back, the manifest stays consistent
+        pool.terminate()
+        writer.terminate()
+        print("interrupted, run again to resume the build")
+        raise SystemExit(1)
+    # close + join instead of terminate: a worker only exits once its queue
+    # feeder thread has flushed, killing it could cut a batch in half
     pool.close()
     pool.join()
-    print("done")
+
+    write_queue.put(None)
+    writer.join()
+    metrics.finish()
 
 if __name__ == '__main__':
-    conn = sqlite3.connect('valid_guesses.db')
-    c = conn.cursor()
-    c.execute("CREATE TABLE IF NOT EXISTS valid_guesses " +
-              "(integer INTEGER, string TEXT)")
-    main()
-    conn.close()
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description="Build valid_guesses.db, resumes an interrupted build.")
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--fresh", action="store_true",
+                        help="drop the manifest and all rows, start over")
+    parser.add_argument("--metrics", default=build_metrics.METRICS_PATH,
+                        help="JSON lines file for the build metrics")
+    args = parser.parse_args()
+
+    conn = get_connection()
+    if args.fresh:
+        conn.execute("DROP TABLE IF EXISTS valid_guesses")
+        conn.execute("DROP TABLE IF EXISTS build_manifest")
+    create_table(conn)
+    create_manifest_table(conn)
+    conn.close()
+    main(args.processes, args.metrics)
+    conn = get_connection()
+    finalize_database(conn)
+    conn.close()
+    expression_store.export_store_from_db(DB_PATH)
@@ -1,3 +1,9 @@
+import argparse
+import contextlib
+import json
+import sys
+
+import feedback_patterns # type: ignore
 import myutils # type: ignore
 
 def main():
@@ -9,7 +15,84 @@ def main():
     while True:
         solver.get_solution()
         solver.enter_feedback()
-        print(f"There are {len(solver.possible_expr)} possible expressions left:")
-        
+        if solver.history[-1][1] == feedback_patterns.ALL_GREEN:
+            print(f"Solved in {solver.guess_count} guesses")
+            break
+        print(f"There are {solver.n_possible} possible expressions left:")
+
+def handle_request(sessions:dict, request:dict) -> dict:
+    """
+    Answers one JSON lines request, see run_jsonl.
+
+    Returns:
+        dict: The response, always with the "game" of the request.
+    """
+
+    game = request.get("game", 0)
+    response = {"game": game}
+    if "solution" in request:
+        session = myutils.SolverSession(seed=request.get("seed"))
+        session.start(request["solution"])
+        sessions[game] = session
+    elif game not in sessions:
+        raise ValueError(f"unknown game {game}, send a solution first")
+    session = sessions[game]
+
+    if request.get("end"):
+        del sessions[game]
+        return response
+    if "candidates" in request:
+        response["candidates"] = session.candidates(request["candidates"])
+        return response
+    if "guess" in request:
+        session.apply(request["guess"], request["pattern"])
+        if session.solved:
+            del sessions[game]
+            response["solved"] = True
+            return response
+
+    response["suggestion"] = session.suggest()
+    response["n_candidates"] = session.solver.n_possible
+    return response
+
+def run_jsonl(lines, output) -> None:
+    """
+    Non-interactive mode: one JSON request per line in, one response out.
+
+    Requests, several games can be interleaved by their "game" id:
+        {"game": 1, "solution": 760}       start, answers with a suggestion
+        {"game": 1, "guess": "2-36+794", "pattern": "gdydggyd"}
+                                           feedback (code, colour string or
+                                           colour list), answers with the
+                                           next suggestion or "solved"
+        {"game": 1, "candidates": 10}      up to 10 remaining candidates
+        {"game": 1, "end": true}           drop the game
+    Errors are answered with {"game": ..., "error": ...}.
+    """
+
+    sessions = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        request = None
+        try:
+            request = json.loads(line)
+            # everything but the responses goes to stderr
+            with contextlib.redirect_stdout(sys.stderr):
+                response = handle_request(sessions, request)
+        except Exception as error:
+            game = request.get("game") if isinstance(request, dict) else None
+            response = {"game": game, "error": str(error)}
+        output.write(json.dumps(response) + "\n")
+        output.flush()
+
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Solver for hard mathler.")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="read JSON lines requests from stdin and " +
+                             "write the responses to stdout")
+    args = parser.parse_args()
+    if args.jsonl:
+        run_jsonl(sys.stdin, sys.stdout)
+    else:
+        main()
@@ -1,31 +1,47 @@
+import os
 import sqlite3
-import multiprocessing
+import threading
+from collections import OrderedDict
 from collections import Counter #, defaultdict
 
-class Expression:
-    def __init__(self, expr):
-        self.expr = expr
-        self.symbols = "0123456789+-*/()"
-        self.total_num_dict = self._count_symbols()
-        self.guaranteed_num_dict = {pos: char for pos,
-                                    char in enumerate(self.expr)}
-    
-    def _count_symbols(self):
-        return {char: self.expr.count(char) for char in self.symbols}
+import numpy as np
+
+import expression_store # type: ignore
+import feedback_patterns # type: ignore
+
+ALL_SYMBOLS = 0xFFFF # allowed-symbol bitmask with all 16 symbols set
+ENTROPY_BUDGET = 4_000_000 # guess x candidate pairs scored per turn
+CACHE_BUDGET = 512 * 2**20 # bytes of candidate sets kept per process
 
 class SolutionFilter:
-    def __init__(self, solution):
+    """Candidate set of one solution value, narrowed down by feedback.
+
+    The candidates are kept as contiguous arrays instead of one object per
+    expression: symbol_matrix (N x 8 uint8, indices into SYMBOLS) and
+    count_matrix (N x 16 uint8, occurrences of every symbol). Both belong to
+    a CandidateSet from the process-wide cache, the filter only holds the
+    indices of the rows that are still possible.
+    """
+
+    def __init__(self, solution, budget:int = ENTROPY_BUDGET,
+                 seed:int = None, book_path:str = None,
+                 tree_path:str = None, verbose:bool = True,
+                 candidates = None):
+        self.solution = int(solution)
+        self.verbose = verbose
         self.guess_count = 0
-        self.symbols = "0123456789+-*/()"
+        self.history = [] # (guess, pattern code) of every applied feedback
+        self.book_path = BOOK_PATH if book_path is None else book_path
+        self.tree_path = TREE_PATH if tree_path is None else tree_path
+        self.budget = budget
+        self.rng = np.random.default_rng(seed)
+        self.symbols = expression_store.SYMBOLS
         self.positions = range(8)
 
-        print(f"loading db solutions for {solution}")
-        possible_expr = load_expressions(sol = solution)
-        self.possible_expr = [Expression(expr) for expr in possible_expr]
-        self.unique_expr = load_expressions_with_no_repeating_chars(
-            sol = solution, expressions = possible_expr)
-        del possible_expr
-        print("loading db solutions done")
+        if candidates is None:
+            candidates = get_candidate_set(self.solution, self._log)
+        self.candidate_set = candidates
+        self.rows = None # indices into candidate_set, None while unfiltered
 
         self.min_total_num_dict = {char: 0 for char in self.symbols}
         self.max_total_num_dict = {char: 7 for char in self.symbols}
@@ -33,6 +49,40 @@ class SolutionFilter:
         self.guaranteed_num_dict = {pos: None for pos in self.positions}
         self.forbidden_num_dict = {pos: [] for pos in self.positions}
 
+    def _log(self, message:str) -> None:
+        if self.verbose:
+            print(message)
+
+    def _view(self, matrix:np.ndarray) -> np.ndarray:
+        return matrix if self.rows is None else matrix[self.rows]
+
+    @property
+    def symbol_matrix(self) -> np.ndarray:
+        return self._view(self.candidate_set.symbol_matrix)
+
+    @property
+    def count_matrix(self) -> np.ndarray:
+        return self._view(self.candidate_set.count_matrix)
+
+    @property
+    def unique_matrix(self) -> np.ndarray:
+        return self.candidate_set.unique_matrix
+
+    @property
+    def n_possible(self) -> int:
+        if self.rows is None:
+            return len(self.candidate_set.symbol_matrix)
+        return len(self.rows)
+
+    @property
+    def possible_expr(self) -> list:
+        """The remaining candidates as strings (decoded on every access)."""
+        return expression_store.decode_expressions(self.symbol_matrix)
+
+    @property
+    def unique_expr(self) -> list:
+        return expression_store.decode_expressions(self.unique_matrix)
+
     def _update_graybased_max(self):
         """For all gray positions we know the exact number of occurrences,
         which we keep track with min_count and use this function to set it to
@@ -42,34 +92,56 @@ class SolutionFilter:
             if self.has_been_gray_dict[sym]:
                 self.max_total_num_dict[sym] = self.min_total_num_dict[sym]
     
-    def _is_expression_still_possible(self, expr) -> bool:
-        """Update current possible expressions are no longer viable"""
-        for pos, sym in enumerate(expr.expr):
-            if (self.guaranteed_num_dict[pos] is not None and
-                self.guaranteed_num_dict[pos] != sym):
-                return False
-            if sym in self.forbidden_num_dict[pos]:
-                return False
-        
-        for sym in self.symbols:
-            count = expr.total_num_dict[sym]
-            if (count < self.min_total_num_dict[sym] or 
-                count > self.max_total_num_dict[sym]):
-                return False
-        return True
-
-    def _filter_expressions(self) -> list:
+    def _compile_constraints(self) -> tuple:
+        """Translates the feedback dicts into arrays.
+
+        Returns:
+            tuple: (allowed, min_counts, max_counts)
+                - allowed (np.ndarray): 8 uint16 bitmasks, bit k of
+                  allowed[pos] is set if SYMBOLS[k] may still be at pos.
+                - min_counts, max_counts (np.ndarray): 16 uint8, bounds on
+                  the occurrences of every symbol.
+        """
+
+        index = {sym: k for k, sym in enumerate(self.symbols)}
+        allowed = np.full(len(self.positions), ALL_SYMBOLS, dtype=np.uint16)
+        for pos in self.positions:
+            if self.guaranteed_num_dict[pos] is not None:
+                allowed[pos] = 1 << index[self.guaranteed_num_dict[pos]]
+            for sym in self.forbidden_num_dict[pos]:
+                allowed[pos] &= ~np.uint16(1 << index[sym])
+        min_counts = np.array([self.min_total_num_dict[sym]
+                               for sym in self.symbols], dtype=np.uint8)
+        max_counts = np.array([self.max_total_num_dict[sym]
+                               for sym in self.symbols], dtype=np.uint8)
+        return allowed, min_counts, max_counts
+
+    def _filter_expressions(self) -> None:
         """Use the updated feedback dicts to
         reduce current possible expressions"""
 
-        self.possible_expr = [expr for expr in self.possible_expr 
-                              if self._is_expression_still_possible(expr)]
+        allowed, min_counts, max_counts = self._compile_constraints()
+        symbol_matrix = self.symbol_matrix
+        count_matrix = self.count_matrix
+        keep = np.ones(self.n_possible, dtype=bool)
+        # only columns that can reject anything, usually a handful
+        for pos in np.flatnonzero(allowed != ALL_SYMBOLS):
+            keep &= ((allowed[pos] >> symbol_matrix[:, pos]) & 1
+                     ).astype(bool)
+        for k in np.flatnonzero(min_counts > 0):
+            keep &= count_matrix[:, k] >= min_counts[k]
+        for k in np.flatnonzero(max_counts < self.candidate_set.count_limit):
+            keep &= count_matrix[:, k] <= max_counts[k]
+        self.rows = (np.flatnonzero(keep) if self.rows is None
+                     else self.rows[keep])
 
     def _apply_feedback(self, guess:str, feedback:str):
         """Feedback should be in the form of a list with colours,
         denoted by 'dark', 'yellow', 'green' """
         
         self.guess_count += 1
+        self.history.append((guess,
+                             feedback_patterns.encode_pattern(feedback)))
         self.min_total_num_dict = {char: 0 for char in self.symbols}
         # Resetting this is okay, as long as we 
         # always keep previously found symbols in the next equation
@@ -95,53 +167,61 @@ class SolutionFilter:
         # But: these frequencies when interpreted as probabilities are not iid,
         # thus looking at this approach probabilistically is flawed.
 
-        rel_freq = calculate_relative_frequencies(self.unique_expr)
-
-        print("Amount of possible unique first solutions: " +
-              str(len(self.unique_expr)))
+        self._log("Amount of possible unique first solutions: " +
+                  str(len(self.unique_matrix)))
 
-        score = []
-        for expr in self.unique_expr:
-            current_score = 1
-            for pos in range(8):
-                current_score *= rel_freq[pos][expr[pos]]
-            score.append(current_score)
-        assert len(score) == len(self.unique_expr)
+        best_guess = most_likely_expression(
+            self.unique_matrix, self.candidate_set.unique_frequencies)
 
-        best_guess = self.unique_expr[score.index(max(score))]
-
-        print("Approximately the best first guess: " + best_guess)
+        self._log("Approximately the best first guess: " + best_guess)
         return best_guess
 
     def _get_solution(self) -> str:
-        """Get next best guess using information gain
-        for guess_expr in self.possible_expr:
-            for solution_expr in self.possible_expr:
-                # Count how many solution
-        """  
-
-        # Placeholder: Based on frequency approach like initial guess:
-        # Might need to this anyway if over 100 guesses are left
-
-        possible_expr = [obj.expr for obj in self.possible_expr]
-
-        rel_freq = calculate_relative_frequencies(possible_expr)
-
-        score = []
-        for expr in possible_expr:
-            current_score = 1
-            for pos in range(8):
-                current_score *= rel_freq[pos][expr[pos]]
-            score.append(current_score)
-        assert len(score) == len(self.possible_expr)
+        """Get next best guess using information gain: the candidate whose
+        feedback partitions the remaining candidates with maximal entropy,
+        estimated on samples if the set exceeds the work budget."""
 
-        best_guess = possible_expr[score.index(max(score))]
+        row = select_entropy_guess(self.symbol_matrix, self.budget, self.rng)
+        best_guess = expression_store.decode_expressions(
+            self.symbol_matrix[row:row + 1])[0]
 
-        print("Approximately the best next guess: " + best_guess)
+        self._log("Approximately the best next guess: " + best_guess)
         return best_guess
 
+    def _get_book_solution(self):
+        """First or second guess from the opening book, None if the book
+        has no entry for the current position."""
+
+        if self.guess_count == 0:
+            return load_book_guess(self.solution, book_path=self.book_path)
+        if self.guess_count == 1:
+            first_guess, pattern = self.history[0]
+            if first_guess == load_book_guess(self.solution,
+                                              book_path=self.book_path):
+                return load_book_guess(self.solution, pattern,
+                                       self.book_path)
+        return None
+
+    def _get_tree_solution(self):
+        """Guess of the decision tree node reached by the feedback so far,
+        None if there is no tree or a guess so far was not the tree's."""
+
+        patterns = [pattern for _, pattern in self.history]
+        for i, (guess, _) in enumerate(self.history):
+            if guess != load_tree_guess(self.solution, patterns[:i],
+                                        self.tree_path):
+                return None
+        return load_tree_guess(self.solution, patterns, self.tree_path)
 
     def get_solution(self) -> str:
+        tree_guess = self._get_tree_solution()
+        if tree_guess is not None:
+            self._log("Decision tree guess: " + tree_guess)
+            return tree_guess
+        book_guess = self._get_book_solution()
+        if book_guess is not None:
+            self._log("Opening book guess: " + book_guess)
+            return book_guess
         if self.guess_count == 0:
             return self._get_first_solution()
         else:
@@ -195,10 +275,250 @@ class SolutionFilter:
         self._apply_feedback(guess, colors)
 
 
-def load_expressions(sol:int) -> list:
+class SolverSession:
+    """Programmatic solver without terminal I/O.
+
+    Usage: start(solution), then alternate suggest() and apply(guess,
+    pattern) until solved. One session plays one game at a time, start()
+    begins the next one.
+
+    Args:
+        budget, seed, book_path, tree_path: Passed on to SolutionFilter.
+    """
+
+    def __init__(self, budget:int = ENTROPY_BUDGET, seed:int = None,
+                 book_path:str = None, tree_path:str = None):
+        self.settings = {"budget": budget, "seed": seed,
+                         "book_path": book_path, "tree_path": tree_path}
+        self.solver = None
+
+    def start(self, solution:int, candidates = None) -> int:
+        """Starts a game, returns the number of candidates.
+
+        candidates (CandidateSet) skips the process-wide cache.
+        """
+
+        self.solver = SolutionFilter(solution, verbose=False,
+                                     candidates=candidates, **self.settings)
+        return self.solver.n_possible
+
+    def _require_game(self) -> SolutionFilter:
+        if self.solver is None:
+            raise RuntimeError("no game started, call start(solution) first")
+        return self.solver
+
+    def suggest(self) -> str:
+        """The guess to play next, None once there are no candidates."""
+
+        solver = self._require_game()
+        if solver.n_possible == 0:
+            return None
+        return solver.get_solution()
+
+    def apply(self, guess:str, pattern) -> int:
+        """
+        Applies the feedback the game gave for a guess.
+
+        Args:
+            guess (str): The guessed expression.
+            pattern: Pattern code (int), colour string like "ggdydydg" or
+                list of colour names.
+
+        Returns:
+            int: Number of candidates left.
+
+        Raises:
+            ValueError: If the guess is not an 8-symbol expression or the
+                pattern is not a valid code or exactly 8 colours.
+        """
+
+        solver = self._require_game()
+        # everything is checked before the game changes, a rejected turn
+        # leaves the session as it was
+        if not isinstance(guess, str):
+            raise ValueError(f"guess has to be a string, not {guess!r}")
+        expression_store.encode_expressions([guess])
+        if isinstance(pattern, (int, np.integer)):
+            if not 0 <= pattern < feedback_patterns.N_PATTERNS:
+                raise ValueError(f"pattern code {pattern} out of range")
+            colours = feedback_patterns.decode_pattern(pattern)
+        else:
+            colours = feedback_patterns.decode_pattern(
+                feedback_patterns.encode_pattern(pattern))
+        solver._apply_feedback(guess, colours)
+        return solver.n_possible
+
+    @property
+    def solved(self) -> bool:
+        solver = self._require_game()
+        return (len(solver.history) > 0 and
+                solver.history[-1][1] == feedback_patterns.ALL_GREEN)
+
+    def candidates(self, limit:int = None) -> list:
+        """The remaining candidates, at most limit of them."""
+
+        solver = self._require_game()
+        return expression_store.decode_expressions(
+            solver.symbol_matrix[:limit])
+
+DB_PATH = 'valid_guesses.db'
+BOOK_PATH = 'opening_book.db'
+TREE_PATH = 'decision_tree.db'
+
+def ensure_value_index(conn) -> None:
+    """Makes sure lookups by solution value do not scan the whole table.
+
+    Databases built by the current generate_valid_expressions.py are
+    clustered on (integer, string) and need nothing. Older databases store
+    valid_guesses as a plain rowid table, for those a covering index on
+    (integer, string) is built once, which takes a while on the full table.
+    """
+
+    table_sql = conn.execute("SELECT sql FROM sqlite_master WHERE " +
+                             "type = 'table' AND name = 'valid_guesses'"
+                             ).fetchone()
+    if table_sql is None or "WITHOUT ROWID" in table_sql[0].upper():
+        return
+    has_index = conn.execute("SELECT 1 FROM sqlite_master WHERE " +
+                             "type = 'index' AND name = " +
+                             "'valid_guesses_integer_string'").fetchone()
+    if has_index is None:
+        print("building covering index on valid_guesses (one-time)")
+        conn.execute("CREATE INDEX valid_guesses_integer_string " +
+                     "ON valid_guesses (integer, string)")
+        conn.commit()
+
+class CandidateSet:
+    """All expressions of one solution value plus data derived from them.
+
+    The arrays are read-only, so one instance can be shared by every
+    filter (and thread) working on the value.
+    """
+
+    def __init__(self, sol:int, symbol_matrix:np.ndarray):
+        self.sol = sol
+        self.symbol_matrix = symbol_matrix
+        self.count_matrix = expression_store.count_symbols(symbol_matrix)
+        # upper bound of count_matrix per symbol, filtering only lowers it
+        self.count_limit = self.count_matrix.max(axis=0, initial=0)
+        self.unique_matrix = symbol_matrix[
+            unique_symbol_mask(self.count_matrix)]
+        self.frequencies = position_frequencies(symbol_matrix) \
+            if len(symbol_matrix) else None
+        self.unique_frequencies = position_frequencies(self.unique_matrix) \
+            if len(self.unique_matrix) else None
+        for array in self._arrays():
+            array.flags.writeable = False
+
+    def _arrays(self) -> list:
+        return [array for array in (self.symbol_matrix, self.count_matrix,
+                                    self.count_limit, self.unique_matrix,
+                                    self.frequencies, self.unique_frequencies)
+                if array is not None]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in self._arrays())
+
+def load_candidate_set(sol:int, log = print) -> CandidateSet:
+    """Loads all expressions of sol into a new CandidateSet."""
+
+    log(f"loading db solutions for {sol}")
+    symbol_matrix = expression_store.unpack_symbols(
+        load_packed_expressions(sol = int(sol)))
+    log("loading db solutions done")
+    return CandidateSet(int(sol), symbol_matrix)
+
+class CandidateCache:
+    """LRU of CandidateSets keyed by solution value, bounded by memory.
+
+    Least recently used sets are evicted once the sets together exceed
+    budget bytes, a set larger than the whole budget is not cached at
+    all. Safe to use from several threads.
+    """
+
+    def __init__(self, budget:int = CACHE_BUDGET):
+        self.budget = budget
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, sol:int, log = print) -> CandidateSet:
+        sol = int(sol)
+        with self.lock:
+            if sol in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(sol)
+                return self.entries[sol]
+            self.misses += 1
+        # loaded outside the lock, a concurrent miss on sol loads it twice
+        candidate_set = load_candidate_set(sol, log)
+        with self.lock:
+            if sol not in self.entries and candidate_set.nbytes <= self.budget:
+                self.entries[sol] = candidate_set
+                self.nbytes += candidate_set.nbytes
+            self._evict()
+        return candidate_set
+
+    def _evict(self) -> None:
+        while self.nbytes > self.budget:
+            _, evicted = self.entries.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+            self.evictions += 1
+
+    def resize(self, budget:int) -> None:
+        with self.lock:
+            self.budget = budget
+            self._evict()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.nbytes,
+                    "budget": self.budget, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+candidate_cache = CandidateCache()
+
+def get_candidate_set(sol:int, log = print) -> CandidateSet:
+    """CandidateSet of sol from the process-wide cache."""
+
+    return candidate_cache.get(sol, log)
+
+def load_packed_expressions(sol:int, db_path:str = DB_PATH,
+                            store_path:str = expression_store.STORE_PATH
+                            ) -> np.ndarray:
+    """Loads all expressions that equal the given solution as packed uint32.
+
+    With a packed store on disk this is a zero-copy slice of the memory map,
+    otherwise the rows are read from SQLite and packed.
+    """
+
+    store = expression_store.open_store(store_path)
+    if store is not None:
+        return store.load(sol)
+    return expression_store.pack_expressions(
+        _load_expressions_from_db(sol, db_path))
+
+def load_expressions(sol:int, db_path:str = DB_PATH,
+                     store_path:str = expression_store.STORE_PATH) -> list:
     """Loads all expressions that equal the given solution"""
 
-    conn = sqlite3.connect('valid_guesses.db')
+    store = expression_store.open_store(store_path)
+    if store is not None:
+        return expression_store.unpack_expressions(store.load(sol))
+    return _load_expressions_from_db(sol, db_path)
+
+def _load_expressions_from_db(sol:int, db_path:str = DB_PATH) -> list:
+    conn = sqlite3.connect(db_path)
+    ensure_value_index(conn)
     c = conn.cursor()
 
     def get_expr(solution:int) -> list:
@@ -208,8 +528,70 @@ def load_expressions(sol:int) -> list:
 
     solutions = get_expr(sol)
     c.close()
+    conn.close()
     return solutions
 
+def load_book_guess(sol:int, pattern:int = None,
+                    book_path:str = BOOK_PATH):
+    """Looks up a precomputed guess in the opening book.
+
+    Args:
+        sol (int): The solution value.
+        pattern (int, optional): Feedback code of the book's first guess,
+            None asks for the first guess itself.
+        book_path (str, optional): Database written by build_opening_book.
+
+    Returns:
+        str: The guess, or None if the book (or the entry) does not exist.
+    """
+
+    if not os.path.exists(book_path):
+        return None
+    conn = sqlite3.connect(book_path)
+    try:
+        if pattern is None:
+            row = conn.execute("SELECT guess FROM first_guess " +
+                               "WHERE integer = ?", (sol,)).fetchone()
+        else:
+            row = conn.execute("SELECT guess FROM second_guess " +
+                               "WHERE integer = ? AND pattern = ?",
+                               (sol, int(pattern))).fetchone()
+    except sqlite3.OperationalError: # no such table, e.g. a first-only book
+        row = None
+    conn.close()
+    return None if row is None else row[0]
+
+def encode_prefix(patterns:list) -> bytes:
+    """Feedback history as a decision tree key, 2 big-endian bytes per
+    pattern code, so keys sort like the code sequences."""
+
+    return np.asarray(patterns, dtype=">u2").tobytes()
+
+def load_tree_guess(sol:int, patterns:list, tree_path:str = TREE_PATH):
+    """Looks up the guess of a decision tree node.
+
+    Args:
+        sol (int): The solution value.
+        patterns (list of int): Feedback codes received so far, [] is the
+            root.
+        tree_path (str, optional): Database written by build_decision_tree.
+
+    Returns:
+        str: The guess, or None if there is no tree or no such node.
+    """
+
+    if not os.path.exists(tree_path):
+        return None
+    conn = sqlite3.connect(tree_path)
+    try:
+        row = conn.execute("SELECT guess FROM tree_node " +
+                           "WHERE integer = ? AND prefix = ?",
+                           (sol, encode_prefix(patterns))).fetchone()
+    except sqlite3.OperationalError:
+        row = None
+    conn.close()
+    return None if row is None else row[0]
+
 def has_unique_chars(input_str:str) -> bool:
     seen_chars = set()
     for char in input_str:
@@ -218,28 +600,58 @@ def has_unique_chars(input_str:str) -> bool:
         seen_chars.add(char)
     return True
 
+def unique_symbol_mask(count_matrix:np.ndarray) -> np.ndarray:
+    """Rows of a symbol count matrix in which no symbol repeats."""
+
+    return count_matrix.max(axis=1, initial=0) <= 1
+
 def load_expressions_with_no_repeating_chars(sol:int,
                                              expressions:list = []) -> list:
     """Loads all expressions that do not have repeating characters 
     and equal the solution"""
 
+    if len(expressions) < 1:
+        symbols = expression_store.unpack_symbols(load_packed_expressions(sol))
+    else:
+        symbols = expression_store.encode_expressions(list(expressions))
+    unique = unique_symbol_mask(expression_store.count_symbols(symbols))
+    return expression_store.decode_expressions(symbols[unique])
+
+def position_frequencies(symbol_matrix:np.ndarray) -> np.ndarray:
+    """Relative frequency of every symbol at every position.
 
-    def find_strings_with_unique_chars(string_list):
-        pool = multiprocessing.Pool()
-        results = pool.map(has_unique_chars, string_list)
+    Array version of calculate_relative_frequencies.
 
-        # Close the pool to free resources
-        pool.close()
-        pool.join()
+    Args:
+        symbol_matrix (np.ndarray): N x 8 symbol matrix, N > 0.
+
+    Returns:
+        np.ndarray: 8 x 16 float matrix, entry [pos, k] is the share of rows
+            with SYMBOLS[k] at pos.
+    """
+
+    n_rows, expr_length = symbol_matrix.shape
+    assert n_rows > 0
+    n_symbols = len(expression_store.SYMBOLS)
+    freq = np.empty((expr_length, n_symbols))
+    for pos in range(expr_length):
+        freq[pos] = np.bincount(symbol_matrix[:, pos], minlength=n_symbols)
+    return freq / n_rows
+
+def most_likely_expression(symbol_matrix:np.ndarray,
+                           freq:np.ndarray = None) -> str:
+    """Row whose product of per-position relative frequencies is largest.
+
+    freq can be passed in if position_frequencies(symbol_matrix) is known.
+    """
+
+    if freq is None:
+        freq = position_frequencies(symbol_matrix)
+    score = np.prod(freq[np.arange(symbol_matrix.shape[1]), symbol_matrix],
+                    axis=1)
+    best = symbol_matrix[np.argmax(score)][None, :]
+    return expression_store.decode_expressions(best)[0]
 
-        # Filter the original list based on the results
-        return [string_list[i] for i, result in enumerate(results) if result]
-    
-    if len(expressions) < 1:
-        return find_strings_with_unique_chars(load_expressions(sol))
-    else:
-        return find_strings_with_unique_chars(expressions)
-    
 def calculate_relative_frequencies(expr:list):
     
     expr_length = len(expr[0])
@@ -260,3 +672,97 @@ def calculate_relative_frequencies(expr:list):
     
     return relative_frequencies
 
+def shape_keys(symbol_matrix:np.ndarray) -> np.ndarray:
+    """Operator layout of every row, e.g. "dd+ddd*d", as an integer key.
+
+    All digits map to one class, every operator and bracket keeps its own.
+    """
+
+    classes = np.maximum(symbol_matrix.astype(np.int64) - 9, 0)
+    weights = 7 ** np.arange(symbol_matrix.shape[1] - 1, -1, -1)
+    return classes @ weights
+
+def stratified_sample(symbol_matrix:np.ndarray, size:int,
+                      rng:np.random.Generator) -> np.ndarray:
+    """Row indices of a sample stratified by operator layout.
+
+    The rows are shuffled within each layout and sorted by layout, a
+    systematic sample over that order gives every layout a share
+    proportional to its size. If there are few layouts, each one also
+    keeps at least one row, so rare layouts are never dropped.
+    """
+
+    n_rows = len(symbol_matrix)
+    if size >= n_rows:
+        return np.arange(n_rows)
+    keys = shape_keys(symbol_matrix)
+    order = np.lexsort((rng.random(n_rows), keys))
+    step = n_rows / size
+    sample = order[((rng.random() + np.arange(size)) * step).astype(np.int64)]
+
+    starts = np.flatnonzero(np.diff(keys[order])) + 1
+    if len(starts) + 1 <= size // 2:
+        # the first row of every layout, a random one due to the shuffle
+        sample = np.concatenate((sample, order[np.concatenate(([0], starts))]))
+    return np.unique(sample)
+
+def partition_entropy(patterns:np.ndarray) -> np.ndarray:
+    """Entropy in bits of the feedback partition of every guess.
+
+    Args:
+        patterns (np.ndarray): G x N pattern codes from feedback_patterns.
+
+    Returns:
+        np.ndarray: G entropies, the expected information of each guess if
+            all N candidates are equally likely.
+    """
+
+    n_guesses, n_candidates = patterns.shape
+    offsets = np.arange(n_guesses)[:, None] * feedback_patterns.N_PATTERNS
+    sizes = np.bincount((patterns + offsets).ravel(),
+                        minlength=n_guesses * feedback_patterns.N_PATTERNS
+                        ).reshape(n_guesses, -1).astype(np.float64)
+    plogp = sizes * np.log2(np.where(sizes > 0, sizes, 1))
+    return np.log2(n_candidates) - plogp.sum(axis=1) / n_candidates
+
+def select_entropy_guess(candidates:np.ndarray,
+                         budget:int = ENTROPY_BUDGET,
+                         rng:np.random.Generator = None) -> int:
+    """
+    Picks the candidate whose feedback splits the candidates best.
+
+    Every guess is scored by the entropy of the partition its feedback
+    patterns induce on the candidates. If scoring all pairs exceeds the
+    budget, guesses and candidates are both replaced by a stratified sample
+    of about sqrt(budget) rows each.
+
+    Args:
+        candidates (np.ndarray): N x 8 symbol matrix of the candidates.
+        budget (int, optional): Maximum number of guess x candidate pairs.
+        rng (np.random.Generator, optional): Source of the samples.
+
+    Returns:
+        int: Row of the best guess in candidates.
+    """
+
+    n_rows = len(candidates)
+    if n_rows <= 2:
+        return 0
+    rng = np.random.default_rng() if rng is None else rng
+
+    n_sample = n_rows if n_rows * n_rows <= budget else int(np.sqrt(budget))
+    guess_rows = stratified_sample(candidates, n_sample, rng)
+    solution_rows = stratified_sample(candidates, n_sample, rng)
+    solutions = candidates[solution_rows]
+
+    best_row, best_entropy = 0, -1.0
+    # blocks of guesses keep the bincount table small
+    block = max(1, 2**22 // (len(solutions) + feedback_patterns.N_PATTERNS))
+    for start in range(0, len(guess_rows), block):
+        rows = guess_rows[start:start + block]
+        entropy = partition_entropy(feedback_patterns.pattern_matrix(
+            candidates[rows], solutions))
+        if entropy.max() > best_entropy:
+            best_entropy = entropy.max()
+            best_row = rows[np.argmax(entropy)]
+    return int(best_row)
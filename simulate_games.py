@@ -0,0 +1,171 @@
+import argparse
+import json
+import multiprocessing
+import time
+
+import numpy as np
+
+import feedback_patterns # type: ignore
+import myutils # type: ignore
+
+# ----- Self-play: the solver against every hidden answer of a value -----
+
+# Every candidate of a solution value is taken as the hidden answer once and
+# a full game is played through SolverSession, with feedback_patterns as the
+# oracle. One JSON line per game is written to the output file, the summary
+# (guess distribution, failure rate, latency percentiles) goes to stdout as
+# one JSON object, so two runs can be compared mechanically.
+
+MAX_GUESSES = 6
+OUTPUT_PATH = 'simulate_games.jsonl'
+PERCENTILES = (50, 90, 99)
+
+_session_settings = {}
+
+def _init_worker(settings:dict) -> None:
+    global _session_settings
+    _session_settings = settings
+
+def play_game(sol:int, answer:str, max_guesses:int = MAX_GUESSES,
+              settings:dict = None) -> dict:
+    """
+    Plays one game against a known answer.
+
+    Args:
+        sol (int): The solution value.
+        answer (str): The hidden expression.
+        max_guesses (int, optional): The game is lost after this many.
+        settings (dict, optional): Keyword arguments of SolverSession.
+
+    Returns:
+        dict: solution, answer, solved, guesses (list of str),
+            turn_seconds (time the solver needed for each guess) and
+            start_seconds (loading the candidates).
+    """
+
+    start_time = time.perf_counter()
+    session = myutils.SolverSession(**(settings or {}))
+    session.start(sol)
+    start_seconds = time.perf_counter() - start_time
+
+    guesses, turn_seconds = [], []
+    while len(guesses) < max_guesses:
+        turn_start = time.perf_counter()
+        guess = session.suggest()
+        turn_seconds.append(time.perf_counter() - turn_start)
+        if guess is None: # the feedback ruled out every candidate
+            break
+        guesses.append(guess)
+        pattern = int(feedback_patterns.pattern_matrix(guess, answer)[0, 0])
+        session.apply(guess, pattern)
+        if session.solved:
+            break
+    return {"solution": sol, "answer": answer,
+            "solved": session.solved,
+            "guesses": guesses, "turn_seconds": turn_seconds,
+            "start_seconds": start_seconds}
+
+def _play_game_star(args:tuple) -> dict:
+    return play_game(*args, settings=_session_settings)
+
+def games(values:list, max_answers:int = None, seed:int = 0) -> list:
+    """(solution, answer) of every game, at most max_answers per value
+    (a random sample if there are more)."""
+
+    rng = np.random.default_rng(seed)
+    result = []
+    for sol in values:
+        answers = myutils.load_expressions(sol)
+        if max_answers is not None and len(answers) > max_answers:
+            picks = np.sort(rng.choice(len(answers), max_answers,
+                                       replace=False))
+            answers = [answers[i] for i in picks]
+        result += [(sol, answer) for answer in answers]
+    return result
+
+def summarize(results:list, elapsed:float) -> dict:
+    n_games = len(results)
+    solved = [len(game["guesses"]) for game in results if game["solved"]]
+    turns = np.array([seconds for game in results
+                      for seconds in game["turn_seconds"]])
+    first_turns = np.array([game["turn_seconds"][0] for game in results])
+
+    def latency(samples:np.ndarray) -> dict:
+        if len(samples) == 0:
+            return {}
+        stats = {f"p{p}": float(np.percentile(samples, p))
+                 for p in PERCENTILES}
+        stats["max"] = float(samples.max())
+        return stats
+
+    return {
+        "games": n_games,
+        "solved": len(solved),
+        "failure_rate": (n_games - len(solved)) / n_games if n_games else None,
+        "mean_guesses": float(np.mean(solved)) if solved else None,
+        "guess_distribution": {str(n): solved.count(n)
+                               for n in sorted(set(solved))},
+        "turn_latency": latency(turns),
+        "first_turn_latency": latency(first_turns),
+        "elapsed": elapsed,
+        "games_per_sec": n_games / elapsed if elapsed > 0 else None,
+    }
+
+def main(values:list, max_answers:int = None, max_guesses:int = MAX_GUESSES,
+         processes:int = None, output_path:str = OUTPUT_PATH,
+         settings:dict = None) -> dict:
+    """
+    Plays all games of the given values in parallel.
+
+    Args:
+        values (list of int): Solution values.
+        max_answers (int, optional): Hidden answers per value, all if None.
+        max_guesses (int, optional): Guesses before a game counts as lost.
+        processes (int, optional): Worker processes, defaults to the number
+            of cores.
+        output_path (str, optional): JSON lines file for the single games.
+        settings (dict, optional): Keyword arguments of SolverSession.
+
+    Returns:
+        dict: The summary, see summarize.
+    """
+
+    start_time = time.perf_counter()
+    tasks = [(sol, answer, max_guesses)
+             for sol, answer in games(values, max_answers)]
+    results = []
+    with open(output_path, "w") as output, \
+            multiprocessing.Pool(processes, initializer=_init_worker,
+                                 initargs=(settings or {},)) as pool:
+        for result in pool.imap_unordered(_play_game_star, tasks,
+                                          chunksize=8):
+            output.write(json.dumps(result) + "\n")
+            results.append(result)
+    return summarize(results, time.perf_counter() - start_time)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Play the solver against every answer of some values.")
+    parser.add_argument("values", type=int, nargs="*")
+    parser.add_argument("--range", type=int, nargs=2, metavar=("START", "STOP"),
+                        help="all values in range(START, STOP)")
+    parser.add_argument("--max-answers", type=int, default=None)
+    parser.add_argument("--max-guesses", type=int, default=MAX_GUESSES)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--budget", type=int, default=myutils.ENTROPY_BUDGET)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--book", default=myutils.BOOK_PATH,
+                        help="opening book, a missing file disables it")
+    parser.add_argument("--tree", default=myutils.TREE_PATH,
+                        help="decision trees, a missing file disables them")
+    args = parser.parse_args()
+
+    values = list(args.values)
+    if args.range is not None:
+        values += list(range(*args.range))
+    settings = {"budget": args.budget, "seed": args.seed,
+                "book_path": args.book, "tree_path": args.tree}
+    summary = main(values, args.max_answers, args.max_guesses,
+                   args.processes, args.output, settings)
+    print(json.dumps(summary))
@@ -0,0 +1,212 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+import myutils # type: ignore
+
+# ----- Local HTTP/JSON solver service -----
+
+# One long-running process hosts many solver sessions:
+#   POST   /sessions                    {"solution": 760, "seed": 1}
+#   POST   /sessions/<id>/feedback      {"guess": "2-36+794",
+#                                        "pattern": "gdydggyd"}
+#   GET    /sessions/<id>/candidates?limit=10
+#   DELETE /sessions/<id>
+#   GET    /stats
+# Session start and feedback answer with the next suggestion (or "solved").
+# The candidate sets of recently used values come from the process-wide
+# myutils.candidate_cache and are shared read-only by all sessions of that
+# value. Loading and scoring run on a
+# thread pool (the numba kernels release the GIL), so the event loop only
+# parses requests.
+
+HOST = '127.0.0.1'
+PORT = 8765
+SESSION_TIMEOUT = 1800 # seconds without a request before a session is dropped
+MAX_BODY = 2**20
+
+class HTTPError(Exception):
+    def __init__(self, status:int, message:str):
+        super().__init__(message)
+        self.status = status
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class SolverService:
+    """Sessions plus the shared candidate cache, independent of HTTP."""
+
+    def __init__(self, cache_budget:int = None, workers:int = None,
+                 session_timeout:float = SESSION_TIMEOUT):
+        if cache_budget is not None:
+            myutils.candidate_cache.resize(cache_budget)
+        self.executor = ThreadPoolExecutor(workers)
+        self.session_timeout = session_timeout
+        self.sessions = {} # id -> [SolverSession, asyncio.Lock, last use]
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, function, *args)
+
+    def _expire_sessions(self) -> None:
+        now = time.monotonic()
+        for session_id in [session_id for session_id, (_, _, last_use)
+                           in self.sessions.items()
+                           if now - last_use > self.session_timeout]:
+            del self.sessions[session_id]
+
+    def _session(self, session_id:str) -> list:
+        if session_id not in self.sessions:
+            raise HTTPError(404, f"unknown session {session_id}")
+        entry = self.sessions[session_id]
+        entry[2] = time.monotonic()
+        return entry
+
+    def _start(self, session:myutils.SolverSession, sol:int) -> dict:
+        n_candidates = session.start(sol)
+        return {"suggestion": session.suggest(), "n_candidates": n_candidates}
+
+    def _feedback(self, session:myutils.SolverSession, guess:str,
+                  pattern) -> dict:
+        n_candidates = session.apply(guess, pattern)
+        if session.solved:
+            return {"solved": True}
+        return {"suggestion": session.suggest(), "n_candidates": n_candidates}
+
+    async def create_session(self, body:dict) -> dict:
+        self._expire_sessions()
+        if "solution" not in body:
+            raise HTTPError(400, "missing solution")
+        session = myutils.SolverSession(seed=body.get("seed"))
+        response = await self._run(self._start, session, int(body["solution"]))
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = [session, asyncio.Lock(),
+                                     time.monotonic()]
+        return {"session": session_id, **response}
+
+    async def feedback(self, session_id:str, body:dict) -> dict:
+        session, lock, _ = self._session(session_id)
+        if "guess" not in body or "pattern" not in body:
+            raise HTTPError(400, "missing guess or pattern")
+        async with lock: # one turn of a session at a time
+            response = await self._run(self._feedback, session,
+                                       body["guess"], body["pattern"])
+        if response.get("solved"):
+            self.sessions.pop(session_id, None)
+        return {"session": session_id, **response}
+
+    async def candidates(self, session_id:str, limit:int = None) -> dict:
+        session, lock, _ = self._session(session_id)
+        async with lock:
+            return {"session": session_id,
+                    "candidates": session.candidates(limit)}
+
+    def delete_session(self, session_id:str) -> dict:
+        self._session(session_id)
+        del self.sessions[session_id]
+        return {"session": session_id, "deleted": True}
+
+    def stats(self) -> dict:
+        self._expire_sessions()
+        return {"sessions": len(self.sessions),
+                "cache": myutils.candidate_cache.stats()}
+
+    async def route(self, method:str, target:str, body:dict) -> tuple:
+        """Dispatches one request, returns (status, response)."""
+
+        url = urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        if parts == ["stats"] and method == "GET":
+            return 200, self.stats()
+        if parts == ["sessions"] and method == "POST":
+            return 201, await self.create_session(body)
+        if len(parts) == 2 and parts[0] == "sessions" and method == "DELETE":
+            return 200, self.delete_session(parts[1])
+        if len(parts) == 3 and parts[0] == "sessions":
+            if parts[2] == "feedback" and method == "POST":
+                return 200, await self.feedback(parts[1], body)
+            if parts[2] == "candidates" and method == "GET":
+                limit = parse_qs(url.query).get("limit", [None])[0]
+                return 200, await self.candidates(
+                    parts[1], None if limit is None else int(limit))
+        raise HTTPError(404, f"no route for {method} {url.path}")
+
+    async def handle_connection(self, reader:asyncio.StreamReader,
+                                writer:asyncio.StreamWriter) -> None:
+        """Minimal HTTP/1.1: JSON bodies with Content-Length, keep-alive."""
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY:
+                        raise HTTPError(413, "body too large")
+                    raw = await reader.readexactly(length) if length else b""
+                    try:
+                        body = json.loads(raw) if raw else {}
+                    except json.JSONDecodeError as error:
+                        raise HTTPError(400, f"invalid JSON: {error}")
+                    status, response = await self.route(method, target, body)
+                except HTTPError as error:
+                    status, response = error.status, {"error": str(error)}
+                except (ValueError, RuntimeError) as error:
+                    status, response = 400, {"error": str(error)}
+                except Exception as error: # keep serving the other sessions
+                    status, response = 500, {"error": repr(error)}
+
+                payload = json.dumps(response).encode()
+                keep_alive = headers.get("connection", "").lower() != "close"
+                writer.write(
+                    (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n" +
+                     "Content-Type: application/json\r\n" +
+                     f"Content-Length: {len(payload)}\r\n" +
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}" +
+                     "\r\n\r\n").encode() + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass # client went away or sent garbage, drop the connection
+        finally:
+            writer.close()
+
+async def serve(host:str = HOST, port:int = PORT, **service_args) -> None:
+    service = SolverService(**service_args)
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    print(f"solver service listening on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Serve solver sessions over local HTTP/JSON.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--cache-budget", type=int, default=None,
+                        help="bytes of candidate sets to keep, default " +
+                             f"{myutils.CACHE_BUDGET}")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads for loading and scoring")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port,
+                          cache_budget=args.cache_budget,
+                          workers=args.workers))
+    except KeyboardInterrupt:
+        pass